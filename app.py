@@ -3,12 +3,16 @@ import os
 from dotenv import load_dotenv
 from src.topic_gen import generate_finance_topics
 from src.script_writer import generate_script
-from src.voiceover import generate_voiceover
-from src.video_gen import create_video
-from src.thumbnail_gen import generate_thumbnail
-from src.uploader import get_authenticated_service, upload_video
-from src.scheduler import add_to_queue, get_queue, process_queue, QUEUE_FILE
+from src.voiceover import generate_voiceover, generate_script_and_voiceover
+from src.video_gen import create_video, plan_video, discard_plan
+from src.proxy_cache import ProxyTimeline, PROXY_FPS
+from src.thumbnail_gen import generate_thumbnail, generate_thumbnail_variants
+from src.scheduler import add_to_queue, get_queue, process_queue, get_quota_status, upload_now, QUEUE_FILE
+from src.uploader import load_channels
+from src.render_queue import add_render_job, get_render_queue, process_render_queue, is_stale, upload_path
 from src.sora_gen import generate_sora_prompt
+from src.footage_library import FootageLibrary
+from src.analytics import AnalyticsStore, sync_analytics
 from datetime import datetime, timedelta
 
 load_dotenv()
@@ -88,9 +92,13 @@ with tabs[0]:
         if st.button("Generate Topics"):
             with st.spinner("Generating topics..."):
                 try:
-                    topics = generate_finance_topics(topic_query, num_topics, api_key=gemini_key)
+                    topics, duplicates = generate_finance_topics(topic_query, num_topics, api_key=gemini_key, return_duplicates=True)
                     st.session_state['topics'] = topics
                     st.success(f"Generated {len(topics)} topics!")
+                    if duplicates:
+                        with st.expander(f"Skipped {len(duplicates)} topics similar to past videos"):
+                            for dup in duplicates:
+                                st.write(f"{dup['title']} ≈ {dup['match']} ({dup['score']:.0%})")
                 except Exception as e:
                     st.error(f"Error: {e}")
 
@@ -115,12 +123,48 @@ with tabs[0]:
 
 with tabs[1]:
     st.header("2. Voiceover Creation")
+    voice_id = st.selectbox("Select Voice", ["Adam (Finance)", "Bella (Soft)", "Antoni (Professional)"], index=0)
+    # Map voice names to IDs (placeholders)
+    v_map = {"Adam (Finance)": "pNInz6obpgDQGcFmaJgB", "Bella (Soft)": "EXAVITQu4vr4xnSDxMaL", "Antoni (Professional)": "ErXwUjzD78v94vL8l4Ew"}
+
+    if 'topics' in st.session_state:
+        with st.expander("Stream script and voiceover together"):
+            st.caption("Writes the script and voices it sentence by sentence, so the opening can be played before the script is finished.")
+            stream_topic = st.selectbox("Topic", st.session_state['topics'], key="stream_topic")
+            if st.button("Stream Script + Voiceover"):
+                out_path = f"outputs/audio/{stream_topic.replace(' ', '_')[:20]}.mp3"
+                script_box = st.empty()
+                status_box = st.empty()
+                opening_player = st.empty()
+                shown = {"opening": False}
+
+                def show_progress(script, stream):
+                    script_box.markdown(script)
+                    status_box.caption(f"{stream.sentences_done} sentences voiced ({stream.bytes_written / 1024:.0f} KB)")
+                    # The player is created once, for the first voiced batch; replacing
+                    # it as audio arrives would cut off playback. The full voiceover
+                    # gets its own player when done.
+                    if stream.sentences_done and not shown["opening"]:
+                        shown["opening"] = True
+                        with open(stream.partial_path, "rb") as f, opening_player.container():
+                            st.caption("Opening (the full voiceover appears below when done):")
+                            st.audio(f.read(), format="audio/mpeg")
+
+                try:
+                    script = generate_script_and_voiceover(stream_topic, out_path, voice_id=v_map[voice_id],
+                                                           gemini_key=gemini_key, eleven_key=eleven_key,
+                                                           on_progress=show_progress)
+                    st.session_state['current_script'] = script
+                    st.session_state['current_topic'] = stream_topic
+                    st.session_state['current_audio'] = out_path
+                    st.success(f"Script and voiceover saved to {out_path}")
+                    st.audio(out_path)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
     if 'current_script' in st.session_state:
         st.write(f"Generate voiceover for: **{st.session_state['current_topic']}**")
-        voice_id = st.selectbox("Select Voice", ["Adam (Finance)", "Bella (Soft)", "Antoni (Professional)"], index=0)
-        # Map voice names to IDs (placeholders)
-        v_map = {"Adam (Finance)": "pNInz6obpgDQGcFmaJgB", "Bella (Soft)": "EXAVITQu4vr4xnSDxMaL", "Antoni (Professional)": "ErXwUjzD78v94vL8l4Ew"}
-        
+
         if st.button("Generate MP3"):
             with st.spinner("Generating voiceover..."):
                 try:
@@ -134,6 +178,33 @@ with tabs[1]:
     else:
         st.info("Write a script first.")
 
+def plan_key(keywords):
+    """
+    What a footage plan depends on: the voiceover (path and file version),
+    the footage keywords and the script captions are built from.
+    """
+    audio = st.session_state['current_audio']
+    return {
+        "audio": audio,
+        "audio_mtime": os.path.getmtime(audio) if os.path.exists(audio) else None,
+        "keywords": [k.strip() for k in keywords.split(",")],
+        "script": st.session_state.get('current_script', "")
+    }
+
+def current_plan(keywords):
+    """
+    The previewed footage plan if it still matches plan_key; a stale plan
+    is discarded along with its downloads.
+    """
+    plan = st.session_state.get('footage_plan')
+    if not plan:
+        return None
+    if all(plan[name] == value for name, value in plan_key(keywords).items()):
+        return plan
+    discard_plan(plan["segments"])
+    st.session_state.pop('footage_plan', None)
+    return None
+
 with tabs[2]:
     st.header("3. Video Assembly")
     if 'current_audio' in st.session_state:
@@ -142,7 +213,50 @@ with tabs[2]:
         col_eng, col_kw = st.columns([1, 2])
         video_engine = col_eng.radio("Video Engine", ["Stock (Pexels)", "Generative (Sora)"])
         keywords = col_kw.text_input("Footage Keywords", value="finance, money, stock market")
+        music_file = st.text_input("Background Music (optional)", value="", help="Path to a music file, mixed under the voiceover and ducked while it speaks.")
+        output_formats = st.multiselect("Output Formats", ["Short (9:16)", "Video (16:9)", "Preview (360p)"],
+                                        help="Leave empty for a single default render. Several formats are rendered in one pass.")
         
+        if video_engine == "Stock (Pexels)":
+            with st.expander("Local Footage Library"):
+                library = FootageLibrary()
+                st.write(f"{len(library)} clips indexed under {len(library.index)} keywords. Library clips are used before Pexels.")
+                footage_dir = st.text_input("Footage Directory", value="footage")
+                if st.button("📂 Ingest Footage"):
+                    with st.spinner("Indexing clips..."):
+                        try:
+                            added = library.ingest_directory(footage_dir)
+                            st.success(f"Indexed {added} new or changed clips.")
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+
+        if video_engine == "Stock (Pexels)":
+            with st.expander("Preview Footage Plan"):
+                st.caption("Plans footage for this voiceover and decodes each clip once into a low-res proxy, so the timeline can be scrubbed before rendering.")
+                if st.button("🎞️ Plan & Preview"):
+                    with st.spinner("Planning footage and building proxies..."):
+                        try:
+                            # Drop the previous plan's downloads before planning again
+                            old_plan = st.session_state.pop('footage_plan', None)
+                            if old_plan:
+                                discard_plan(old_plan["segments"])
+                            key = plan_key(keywords)
+                            segments, captions, duration = plan_video(key["audio"], key["keywords"], key["script"])
+                            st.session_state['footage_plan'] = dict(key, segments=segments,
+                                                                    timeline=ProxyTimeline(segments, captions))
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+
+                plan = current_plan(keywords)
+                if plan and plan["segments"]:
+                    timeline = plan["timeline"]
+                    position = st.slider("Timeline", 0.0, float(timeline.duration), 0.0, step=1 / PROXY_FPS, format="%.1fs")
+                    show_captions = st.checkbox("Show captions", value=True)
+                    seg_index = timeline.segment_at(position)
+                    segment = plan["segments"][seg_index]
+                    st.image(timeline.frame_at(position, captions=show_captions), use_container_width=True,
+                             caption=f"Clip {seg_index + 1}/{len(plan['segments'])}: {os.path.basename(segment['path'])} ({segment['source']})")
+
         if video_engine == "Generative (Sora)":
             custom_sora_prompt = st.text_area("Custom Sora Prompt", 
                                             value=st.session_state.get('sora_prompt_optimized', st.session_state.get('current_script', "")[:500]), 
@@ -166,19 +280,49 @@ with tabs[2]:
                     kw_list = [k.strip() for k in keywords.split(",")]
                     # Use custom prompt if provided, else fallback to script
                     final_prompt = custom_sora_prompt if custom_sora_prompt else st.session_state.get('current_script', "")
-                    create_video(
+                    format_map = {"Short (9:16)": "short", "Video (16:9)": "landscape", "Preview (360p)": "preview"}
+                    # Render the previewed plan if it is still for this voiceover, keywords and script
+                    plan = current_plan(keywords) if engine_map[video_engine] == "stock" else None
+                    planned = plan["segments"] if plan else None
+                    result = create_video(
                         st.session_state['current_audio'], 
                         video_path, 
                         keywords=kw_list, 
                         script_text=final_prompt,
                         source=engine_map[video_engine],
-                        sora_api_key=sora_key
+                        sora_api_key=sora_key,
+                        profiles=[format_map[f] for f in output_formats] or None,
+                        music_path=music_file or None,
+                        segments=planned
                     )
+                    # Downloaded plan footage is cleaned up by the render
+                    if planned:
+                        st.session_state.pop('footage_plan', None)
+                    if isinstance(result, dict):
+                        # Queue/upload the first non-preview output
+                        video_path = upload_path(result)
+                        st.session_state['current_outputs'] = result
                     st.session_state['current_video'] = video_path
                     st.success(f"Video created: {video_path}")
                     st.video(video_path)
                 except Exception as e:
                     st.error(f"Error: {e}")
+
+        if st.button("🗂️ Add to Render Queue", help="Render in the background and queue the result for upload."):
+            format_map = {"Short (9:16)": "short", "Video (16:9)": "landscape", "Preview (360p)": "preview"}
+            topic = st.session_state['current_topic']
+            add_render_job(
+                st.session_state['current_audio'],
+                f"outputs/videos/{topic.replace(' ', '_')[:20]}.mp4",
+                topic,
+                f"Check out this video on {topic}\n\n#finance #money #shorts",
+                keywords=[k.strip() for k in keywords.split(",")],
+                script_text=(custom_sora_prompt if custom_sora_prompt else st.session_state.get('current_script', "")),
+                source={"Stock (Pexels)": "stock", "Generative (Sora)": "sora"}[video_engine],
+                profiles=[format_map[f] for f in output_formats] or None,
+                music_path=music_file or None
+            )
+            st.success("Added to the render queue. Process it from the 'Queue & Schedule' tab or run `python -m src.render_queue`.")
     else:
         st.info("Generate a voiceover first.")
 
@@ -192,13 +336,27 @@ with tabs[3]:
             thumb_text = st.text_input("Thumbnail Text", value=st.session_state['current_topic'][:30].upper())
             if st.button("Generate Thumbnail"):
                 try:
-                    thumb_path = f"outputs/thumbnails/{st.session_state['current_topic'].replace(' ', '_')[:20]}.png"
-                    generate_thumbnail(thumb_text, thumb_path)
-                    st.session_state['current_thumbnail'] = thumb_path
-                    st.image(thumb_path)
-                    st.success(f"Thumbnail saved to {thumb_path}")
+                    if 'current_video' in st.session_state:
+                        # Several text styles over the best frame of the rendered video
+                        variants = generate_thumbnail_variants(st.session_state['current_video'], thumb_text, "outputs/thumbnails")
+                        st.session_state['thumbnail_variants'] = variants
+                        st.session_state['current_thumbnail'] = next(iter(variants.values()))
+                    else:
+                        thumb_path = f"outputs/thumbnails/{st.session_state['current_topic'].replace(' ', '_')[:20]}.png"
+                        generate_thumbnail(thumb_text, thumb_path)
+                        st.session_state['current_thumbnail'] = thumb_path
+                        st.session_state.pop('thumbnail_variants', None)
+                    st.success(f"Thumbnail saved to {st.session_state['current_thumbnail']}")
                 except Exception as e:
                     st.error(f"Error: {e}")
+
+            if st.session_state.get('thumbnail_variants'):
+                variants = st.session_state['thumbnail_variants']
+                choice = st.radio("Thumbnail Variant", list(variants.keys()), horizontal=True)
+                st.session_state['current_thumbnail'] = variants[choice]
+                st.image(variants[choice])
+            elif 'current_thumbnail' in st.session_state:
+                st.image(st.session_state['current_thumbnail'])
         else:
             st.info("Write a script first.")
 
@@ -208,12 +366,13 @@ with tabs[3]:
             video_title = st.text_input("YouTube Title", value=st.session_state['current_topic'])
             video_desc = st.text_area("Description", value=f"Check out this video on {st.session_state['current_topic']}\n\n#finance #money #shorts")
             
+            upload_channel = st.selectbox("Channel", list(load_channels().keys()), key="upload_channel")
+            
             if st.button("🚀 Upload Now"):
                 st.info("Authenticating via YouTube API...")
                 try:
-                    # Authenticate and upload
-                    youtube = get_authenticated_service()
-                    response = upload_video(youtube, st.session_state['current_video'], video_title, video_desc)
+                    # Authenticate and upload, counted against the channel's daily quota
+                    response = upload_now(st.session_state['current_video'], video_title, video_desc, channel=upload_channel)
                     st.success(f"Upload successful! Video ID: {response.get('id')}")
                     # st.warning("YouTube Upload is in 'Blueprint Mode'. In production, ensure client_secrets.json is configured and OAuth flow is handled.")
                     st.info(f"Video ready at: {st.session_state['current_video']}")
@@ -235,20 +394,38 @@ with tabs[4]:
             d = st.date_input("Scheduled Date", datetime.now())
             t = st.time_input("Scheduled Time", datetime.now() + timedelta(hours=1))
             full_dt = datetime.combine(d, t)
+            channel = st.selectbox("Channel", list(load_channels().keys()))
             
             if st.button("📅 Add to Queue"):
                 add_to_queue(
                     st.session_state['current_video'], 
                     st.session_state['current_topic'], 
                     f"Check out this video on {st.session_state['current_topic']}\n\n#finance #money #shorts",
-                    full_dt
+                    full_dt,
+                    channel=channel
                 )
                 st.success(f"Video queued for {full_dt.strftime('%Y-%m-%d %H:%M:%S')}")
         else:
             st.info("Generate a video in the 'Video Gen' tab first.")
 
     with col2:
+        st.subheader("Render Queue")
+        render_jobs = get_render_queue()
+        # Jobs another run is rendering are left to it
+        pending_renders = [job for job in render_jobs if job["status"] == "queued" or is_stale(job)]
+        rendering = len([j for j in render_jobs if j["status"] == "rendering" and not is_stale(j)])
+        st.write(f"{len(pending_renders)} pending renders, {rendering} rendering, "
+                 f"{len([j for j in render_jobs if j['status'] == 'failed'])} failed.")
+        if pending_renders and st.button("🎬 Render Pending Videos"):
+            with st.spinner(f"Rendering {len(pending_renders)} videos..."):
+                process_render_queue()
+            st.rerun()
+
         st.subheader("Manage Queue")
+        for quota in get_quota_status():
+            st.metric(f"Quota left: {quota['channel']}", f"{quota['remaining']} units",
+                      f"{quota['uploads_left']} uploads until {quota['resets_at']}", delta_color="off")
+
         q_status = st.selectbox("Filter by Status", ["All", "queued", "uploaded", "failed"], index=0)
         
         if st.button("🔄 Refresh & Process Queue"):
@@ -264,7 +441,10 @@ with tabs[4]:
         else:
             from src.scheduler import delete_from_queue, update_queue_item
             for item in queue:
-                with st.expander(f"{item['status'].upper()}: {item['title']} - {item['schedule_time']}"):
+                label = f"{item['status'].upper()}: {item['title']} - {item['schedule_time']} ({item.get('channel', 'default')})"
+                if item['status'] == "queued" and item.get('deferred_until'):
+                    label += f" - deferred until {item['deferred_until']} (quota)"
+                with st.expander(label):
                     # Editing fields
                     new_title = st.text_input("Title", value=item['title'], key=f"edit_t_{item['id']}")
                     new_desc = st.text_area("Description", value=item['description'], key=f"edit_d_{item['id']}")
@@ -293,12 +473,58 @@ with tabs[4]:
 
 with tabs[5]:
     st.header("6. Channel Analytics")
-    st.info("This is a placeholder for your YouTube channel performance metrics.")
-    
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Views", "1.2k", "+12%")
-    col2.metric("Watch Time", "45h", "+5%")
-    col3.metric("Subscribers", "124", "+2")
-    
-    st.line_chart({"Views": [10, 25, 40, 35, 60, 80, 110]})
+    analytics = AnalyticsStore()
+
+    col_sync, col_last = st.columns([1, 3])
+    if col_sync.button("Sync Analytics"):
+        with st.spinner("Fetching new stats from YouTube Analytics..."):
+            try:
+                result = sync_analytics(store=analytics)
+                st.success(f"Synced {result['days']} days across {result['videos']} videos ({result['requests']} requests).")
+                for channel, error in result["errors"].items():
+                    st.warning(f"Skipped {channel}: {error}")
+            except Exception as e:
+                st.error(f"Error: {e}")
+    last_sync = analytics.last_sync()
+    col_last.caption(f"Last sync: {last_sync['synced_at']}" if last_sync else "Not synced yet. Stats cover uploaded videos from the queue.")
+
+    channel_names = analytics.channels()
+    if channel_names:
+        col_ch, col_win = st.columns(2)
+        channel_filter = col_ch.selectbox("Channel", ["All"] + channel_names)
+        window = col_win.selectbox("Period", [7, 28, 90], index=1, format_func=lambda d: f"Last {d} days")
+        channel_filter = None if channel_filter == "All" else channel_filter
+
+        end = datetime.now().date() - timedelta(days=1)
+        start = end - timedelta(days=window - 1)
+        prev_end = start - timedelta(days=1)
+        prev_start = prev_end - timedelta(days=window - 1)
+        current = analytics.totals(start.isoformat(), end.isoformat(), channel_filter)
+        previous = analytics.totals(prev_start.isoformat(), prev_end.isoformat(), channel_filter)
 
+        def change(key):
+            if not previous[key]:
+                return None
+            return f"{(current[key] - previous[key]) / previous[key]:+.0%}"
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Views", f"{current['views']:,}", change("views"))
+        col2.metric("Watch Time", f"{current['watch_minutes'] / 60:,.0f}h", change("watch_minutes"))
+        col3.metric("Subscribers", f"{current['subscribers_gained']:+,}", change("subscribers_gained"))
+
+        series = analytics.daily_series(start.isoformat(), end.isoformat(), channel_filter)
+        if series:
+            st.line_chart({"Views": {row["day"]: row["views"] for row in series}})
+
+        st.subheader("Top Videos")
+        st.dataframe([{
+            "Title": row["title"],
+            "Channel": row["channel"],
+            "Uploaded": row["uploaded_on"],
+            "Views": row["views"],
+            "Watch Time (h)": round(row["watch_minutes"] / 60, 1),
+            "Subscribers": row["subscribers_gained"],
+            "Queue ID": row["queue_id"]
+        } for row in analytics.top_videos(20, channel_filter)], use_container_width=True)
+    else:
+        st.info("No analytics yet. Upload videos from the queue, then sync.")
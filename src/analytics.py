@@ -0,0 +1,371 @@
+import os
+import sys
+import hashlib
+import sqlite3
+from datetime import date, datetime, timedelta
+
+ANALYTICS_DB = "outputs/analytics.db"
+# Offline runs with generated numbers (--fake) never touch the real store
+FAKE_ANALYTICS_DB = "outputs/analytics_fake.db"
+
+# Metrics pulled per video per day, in the order the API returns them.
+METRICS = ["views", "estimatedMinutesWatched", "averageViewDuration", "likes", "subscribersGained"]
+COLUMNS = ["views", "watch_minutes", "avg_view_duration", "likes", "subscribers_gained"]
+
+# Recent days keep changing while YouTube finalizes them, so each sync
+# fetches this many trailing days again even if they are stored.
+REFRESH_DAYS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    queue_id TEXT,
+    channel TEXT NOT NULL,
+    title TEXT,
+    uploaded_on TEXT NOT NULL,
+    synced_through TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_queue ON videos (queue_id);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    video_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    watch_minutes REAL NOT NULL,
+    avg_view_duration REAL NOT NULL,
+    likes INTEGER NOT NULL,
+    subscribers_gained INTEGER NOT NULL,
+    PRIMARY KEY (video_id, day)
+) WITHOUT ROWID;
+-- Covers date-range scans over all videos without touching the table
+CREATE INDEX IF NOT EXISTS idx_daily_day ON daily_stats (day, video_id, views, watch_minutes, subscribers_gained);
+
+-- Rollups, kept up to date by sync so the dashboard reads only these
+CREATE TABLE IF NOT EXISTS video_totals (
+    video_id TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    watch_minutes REAL NOT NULL,
+    likes INTEGER NOT NULL,
+    subscribers_gained INTEGER NOT NULL,
+    first_day TEXT,
+    last_day TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_totals_views ON video_totals (channel, views DESC);
+
+CREATE TABLE IF NOT EXISTS channel_daily (
+    channel TEXT NOT NULL,
+    day TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    watch_minutes REAL NOT NULL,
+    subscribers_gained INTEGER NOT NULL,
+    videos INTEGER NOT NULL,
+    PRIMARY KEY (channel, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_log (
+    synced_at TEXT NOT NULL,
+    videos INTEGER NOT NULL,
+    days INTEGER NOT NULL,
+    requests INTEGER NOT NULL
+);
+"""
+
+
+class AnalyticsStore:
+    """
+    Local per-video daily stats in SQLite, linked to upload queue items
+    (src.scheduler) by queue ID and YouTube video ID.
+    """
+    def __init__(self, path=ANALYTICS_DB):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        # Sync commits once per video; WAL keeps those commits cheap and
+        # lets the dashboard read while a sync is running
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def register_videos(self, items, default_channel):
+        """
+        Adds uploaded queue items (those with a video_id) to the store.
+        Items without a channel (queued before channels.json) belong to
+        `default_channel`; videos stored under another channel are moved.
+        Returns how many rows changed.
+        """
+        before = self.db.total_changes
+        with self.db:
+            for item in items:
+                if not item.get("video_id"):
+                    continue
+                channel = item.get("channel") or default_channel
+                uploaded_on = (item.get("uploaded_at") or item.get("schedule_time") or item["created_at"])[:10]
+                stored = self.db.execute("SELECT channel FROM videos WHERE video_id = ?", (item["video_id"],)).fetchone()
+                if stored and stored[0] != channel:
+                    self._move_video(item["video_id"], stored[0], channel)
+                self.db.execute(
+                    "INSERT INTO videos (video_id, queue_id, channel, title, uploaded_on) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(video_id) DO UPDATE SET queue_id = excluded.queue_id, title = excluded.title",
+                    (item["video_id"], item.get("id"), channel, item.get("title"), uploaded_on))
+        return self.db.total_changes - before
+
+    def _move_video(self, video_id, old, new):
+        """
+        Re-files a stored video under another channel, moving its share of
+        the channel rollups with it.
+        """
+        rows = self.db.execute(
+            "SELECT day, views, watch_minutes, subscribers_gained FROM daily_stats WHERE video_id = ?",
+            (video_id,)).fetchall()
+        for channel, sign in ((old, -1), (new, 1)):
+            self.db.executemany(
+                "INSERT INTO channel_daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(channel, day) DO UPDATE SET "
+                "views = views + excluded.views, watch_minutes = watch_minutes + excluded.watch_minutes, "
+                "subscribers_gained = subscribers_gained + excluded.subscribers_gained, "
+                "videos = videos + excluded.videos",
+                [(channel, row["day"], sign * row["views"], sign * row["watch_minutes"],
+                  sign * row["subscribers_gained"], sign) for row in rows])
+        self.db.execute("DELETE FROM channel_daily WHERE channel = ? AND videos <= 0", (old,))
+        self.db.execute("UPDATE videos SET channel = ? WHERE video_id = ?", (new, video_id))
+        self.db.execute("UPDATE video_totals SET channel = ? WHERE video_id = ?", (new, video_id))
+
+    def pending(self, through):
+        """
+        Videos missing days up to `through` (ISO date), with the first day
+        each needs: the day after its last synced day, minus the refresh
+        window, and never before upload.
+        Returns a list of (video_id, channel, start_day).
+        """
+        rows = self.db.execute(
+            "SELECT video_id, channel, uploaded_on, synced_through FROM videos "
+            "WHERE uploaded_on <= ? AND (synced_through IS NULL OR synced_through < ?)", (through, through))
+        result = []
+        for row in rows:
+            start = row["uploaded_on"]
+            if row["synced_through"]:
+                refresh_from = date.fromisoformat(row["synced_through"]) - timedelta(days=REFRESH_DAYS - 1)
+                start = max(start, refresh_from.isoformat())
+            result.append((row["video_id"], row["channel"], start))
+        return result
+
+    def store_days(self, video_id, rows, synced_through):
+        """
+        Upserts daily rows ({"day", <COLUMNS>}) for a video and refreshes
+        the rollups they touch.
+        """
+        with self.db:
+            if rows:
+                self._apply_channel_deltas(video_id, rows)
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO daily_stats (video_id, day, {', '.join(COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' for _ in COLUMNS)})",
+                [(video_id, row["day"], *(row[c] for c in COLUMNS)) for row in rows])
+            self.db.execute("UPDATE videos SET synced_through = ? WHERE video_id = ?", (synced_through, video_id))
+            self._refresh_video_totals(video_id)
+
+    def _refresh_video_totals(self, video_id):
+        self.db.execute(
+            "INSERT OR REPLACE INTO video_totals "
+            "SELECT v.video_id, v.channel, COALESCE(SUM(d.views), 0), COALESCE(SUM(d.watch_minutes), 0), "
+            "COALESCE(SUM(d.likes), 0), COALESCE(SUM(d.subscribers_gained), 0), MIN(d.day), MAX(d.day) "
+            "FROM videos v LEFT JOIN daily_stats d ON d.video_id = v.video_id WHERE v.video_id = ?", (video_id,))
+
+    def _apply_channel_deltas(self, video_id, rows):
+        """
+        Adds the difference between `rows` and what is stored for the video
+        to the channel's daily rollup, so a sync costs O(new rows) rather
+        than re-aggregating every video.
+        """
+        channel = self.db.execute("SELECT channel FROM videos WHERE video_id = ?", (video_id,)).fetchone()[0]
+        stored = {
+            row["day"]: row for row in self.db.execute(
+                "SELECT day, views, watch_minutes, subscribers_gained FROM daily_stats "
+                "WHERE video_id = ? AND day BETWEEN ? AND ?",
+                (video_id, min(r["day"] for r in rows), max(r["day"] for r in rows)))
+        }
+        deltas = []
+        for row in rows:
+            old = stored.get(row["day"])
+            deltas.append((
+                channel, row["day"],
+                row["views"] - (old["views"] if old else 0),
+                row["watch_minutes"] - (old["watch_minutes"] if old else 0),
+                row["subscribers_gained"] - (old["subscribers_gained"] if old else 0),
+                0 if old else 1
+            ))
+        self.db.executemany(
+            "INSERT INTO channel_daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(channel, day) DO UPDATE SET "
+            "views = views + excluded.views, watch_minutes = watch_minutes + excluded.watch_minutes, "
+            "subscribers_gained = subscribers_gained + excluded.subscribers_gained, videos = videos + excluded.videos",
+            deltas)
+
+    def log_sync(self, videos, days, requests):
+        with self.db:
+            self.db.execute("INSERT INTO sync_log VALUES (?, ?, ?, ?)",
+                            (datetime.now().isoformat(timespec="seconds"), videos, days, requests))
+
+    def last_sync(self):
+        row = self.db.execute("SELECT * FROM sync_log ORDER BY synced_at DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    # Dashboard queries: all read the rollup tables only.
+
+    def channels(self):
+        return [row[0] for row in self.db.execute("SELECT DISTINCT channel FROM videos ORDER BY channel")]
+
+    def _channel_filter(self, channel, column="channel"):
+        return (f"AND {column} = ?", (channel,)) if channel else ("", ())
+
+    def daily_series(self, start, end, channel=None):
+        """
+        Per-day channel totals between `start` and `end` (ISO dates).
+        """
+        where, args = self._channel_filter(channel)
+        rows = self.db.execute(
+            f"SELECT day, SUM(views) AS views, SUM(watch_minutes) AS watch_minutes, "
+            f"SUM(subscribers_gained) AS subscribers_gained FROM channel_daily "
+            f"WHERE day BETWEEN ? AND ? {where} GROUP BY day ORDER BY day", (start, end, *args))
+        return [dict(row) for row in rows]
+
+    def totals(self, start, end, channel=None):
+        where, args = self._channel_filter(channel)
+        row = self.db.execute(
+            f"SELECT COALESCE(SUM(views), 0) AS views, COALESCE(SUM(watch_minutes), 0) AS watch_minutes, "
+            f"COALESCE(SUM(subscribers_gained), 0) AS subscribers_gained FROM channel_daily "
+            f"WHERE day BETWEEN ? AND ? {where}", (start, end, *args)).fetchone()
+        return dict(row)
+
+    def top_videos(self, limit=10, channel=None):
+        where, args = self._channel_filter(channel, "t.channel")
+        rows = self.db.execute(
+            f"SELECT t.*, v.title, v.queue_id, v.uploaded_on FROM video_totals t "
+            f"JOIN videos v ON v.video_id = t.video_id WHERE 1 = 1 {where} "
+            f"ORDER BY t.views DESC LIMIT ?", (*args, limit))
+        return [dict(row) for row in rows]
+
+    def video_for_queue_item(self, queue_id):
+        row = self.db.execute(
+            "SELECT t.* FROM videos v JOIN video_totals t ON t.video_id = v.video_id WHERE v.queue_id = ?",
+            (queue_id,)).fetchone()
+        return dict(row) if row else None
+
+
+def fetch_daily(api, video_id, start, end):
+    """
+    Queries per-day metrics for one video between `start` and `end`
+    (inclusive ISO dates). `api` is a youtubeAnalytics v2 client.
+    Returns a list of {"day", <COLUMNS>}.
+    """
+    response = api.reports().query(
+        ids="channel==MINE",
+        startDate=start,
+        endDate=end,
+        metrics=",".join(METRICS),
+        dimensions="day",
+        filters=f"video=={video_id}",
+        sort="day"
+    ).execute()
+    headers = [h["name"] for h in response.get("columnHeaders", [])]
+    rows = []
+    for values in response.get("rows", []):
+        record = dict(zip(headers, values))
+        row = {"day": record["day"]}
+        for metric, column in zip(METRICS, COLUMNS):
+            row[column] = record.get(metric, 0)
+        rows.append(row)
+    return rows
+
+
+def sync_analytics(get_api=None, store=None, queue=None, today=None, default_channel=None):
+    """
+    Brings the store up to date with every uploaded video in the queue,
+    fetching only the days each video is missing (plus the refresh
+    window). Stats are available through yesterday.
+    `get_api(channel)` returns an Analytics client; defaults to the
+    channel's OAuth client. Queue items without a channel belong to
+    `default_channel` (defaults to the first configured channel).
+    A channel whose client or requests fail is skipped until the next sync;
+    the others still sync.
+    Returns {"videos", "days", "requests", "errors": {channel: message}}.
+    """
+    if get_api is None:
+        from src.uploader import get_analytics_service
+        get_api = get_analytics_service
+    if default_channel is None:
+        from src.uploader import get_channel
+        default_channel = get_channel()[0]
+    if queue is None:
+        from src.scheduler import get_queue
+        queue = get_queue()
+    store = store or AnalyticsStore()
+    through = ((today or date.today()) - timedelta(days=1)).isoformat()
+
+    store.register_videos((item for item in queue if item.get("status") == "uploaded"), default_channel)
+    apis = {}
+    errors = {}
+    stats = {"videos": 0, "days": 0, "requests": 0}
+    for video_id, channel, start in store.pending(through):
+        if channel in errors:
+            continue
+        try:
+            if channel not in apis:
+                apis[channel] = get_api(channel)
+            stats["requests"] += 1
+            rows = fetch_daily(apis[channel], video_id, start, through)
+        except Exception as e:
+            print(f"Skipping analytics for channel {channel}: {e}")
+            errors[channel] = str(e)
+            continue
+        store.store_days(video_id, rows, through)
+        stats["videos"] += 1
+        stats["days"] += len(rows)
+    store.log_sync(**stats)
+    return dict(stats, errors=errors)
+
+
+class FakeAnalyticsAPI:
+    """
+    Offline stand-in for the youtubeAnalytics v2 client: returns stable,
+    plausible numbers derived from the video ID and day. Counts queries so
+    incremental syncs can be checked.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def reports(self):
+        return self
+
+    def query(self, ids, startDate, endDate, metrics, dimensions, filters, sort=None):
+        self.queries.append((filters, startDate, endDate))
+        video_id = filters.split("==", 1)[1]
+        rows = []
+        day = date.fromisoformat(startDate)
+        while day <= date.fromisoformat(endDate):
+            seed = int(hashlib.md5(f"{video_id}{day}".encode()).hexdigest()[:8], 16)
+            views = seed % 500
+            rows.append([day.isoformat(), views, round(views * 0.6, 1), 35 + seed % 40, views // 25, seed % 7])
+            day += timedelta(days=1)
+        headers = [{"name": "day"}] + [{"name": m} for m in metrics.split(",")]
+        return _FakeRequest({"columnHeaders": headers, "rows": rows})
+
+
+class _FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.analytics [--fake]
+    if "--fake" in sys.argv:
+        fake = FakeAnalyticsAPI()
+        print(sync_analytics(get_api=lambda channel: fake, store=AnalyticsStore(FAKE_ANALYTICS_DB)))
+    else:
+        print(sync_analytics())
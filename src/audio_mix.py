@@ -0,0 +1,249 @@
+import os
+import json
+import wave
+import hashlib
+import subprocess
+import numpy as np
+from src.ffmpeg_utils import get_ffmpeg_exe
+
+AUDIO_CACHE_DIR = "outputs/artifacts/audio_mix"
+SAMPLE_RATE = 48000
+
+# Disk budget for cached mixes (about 11 MB per minute); the least
+# recently used go first.
+AUDIO_CACHE_BYTES = 1024 ** 3
+
+# Loudness targets (LUFS). -14 is what YouTube normalises playback to.
+TARGET_LUFS = -14.0
+MUSIC_LUFS = -26.0
+TRUE_PEAK = -1.0
+
+# Ducking: how far music drops under speech, and how fast it moves.
+DUCK_DB = -12.0
+DUCK_ATTACK = 0.05
+DUCK_RELEASE = 0.4
+VOICE_THRESHOLD_DB = -45.0
+
+
+def decode_audio(path, sample_rate=SAMPLE_RATE, channels=2):
+    """
+    Decodes any audio file to a float32 array of shape (samples, channels)
+    with one ffmpeg call.
+    """
+    cmd = [get_ffmpeg_exe(), "-loglevel", "error", "-i", path, "-vn",
+           "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, channels)
+
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE):
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return path
+
+
+def _biquad_response(b, a, freqs, sample_rate):
+    z = np.exp(-2j * np.pi * freqs / sample_rate)
+    return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+
+def _k_weighting_coefficients(sample_rate):
+    """
+    ITU-R BS.1770 K-weighting (high shelf + high pass) for any sample rate.
+    """
+    # Stage 1: high shelf
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh, vb = 10 ** (gain / 20), (10 ** (gain / 20)) ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    # Stage 2: high pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return shelf, highpass
+
+
+def k_weight(samples, sample_rate=SAMPLE_RATE):
+    """
+    Applies K-weighting in the frequency domain: one FFT per channel instead
+    of a per-sample IIR loop. Loudness only depends on the filtered energy,
+    so the magnitude response is all that matters here.
+    """
+    n = len(samples)
+    # Zero padding keeps the filter tail from wrapping onto the start
+    size = n + sample_rate // 10
+    spectrum = np.fft.rfft(samples, n=size, axis=0)
+    freqs = np.fft.rfftfreq(size, 1 / sample_rate)
+    response = np.ones(len(freqs))
+    for b, a in _k_weighting_coefficients(sample_rate):
+        response *= np.abs(_biquad_response(b, a, freqs, sample_rate))
+    return np.fft.irfft(spectrum * response[:, None], n=size, axis=0)[:n]
+
+
+def integrated_loudness(samples, sample_rate=SAMPLE_RATE):
+    """
+    Gated integrated loudness (LUFS) per ITU-R BS.1770-4: 400 ms blocks with
+    75% overlap, -70 LUFS absolute gate, -10 LU relative gate.
+    """
+    block, hop = int(0.4 * sample_rate), int(0.1 * sample_rate)
+    if len(samples) < block:
+        return -70.0
+    weighted = k_weight(samples, sample_rate)
+    energy = np.concatenate([[0.0], np.cumsum((weighted ** 2).sum(axis=1))])
+    starts = np.arange(0, len(samples) - block + 1, hop)
+    block_power = (energy[starts + block] - energy[starts]) / block
+    block_lufs = -0.691 + 10 * np.log10(np.maximum(block_power, 1e-12))
+
+    gated = block_power[block_lufs > -70.0]
+    if not len(gated):
+        return -70.0
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = block_power[(block_lufs > -70.0) & (block_lufs > relative)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def normalize_loudness(samples, target_lufs, sample_rate=SAMPLE_RATE, peak_db=TRUE_PEAK):
+    """
+    Scales samples to `target_lufs`, backing off if that would push the
+    sample peak above `peak_db`.
+    """
+    loudness = integrated_loudness(samples, sample_rate)
+    if loudness <= -70.0:
+        return samples
+    gain = 10 ** ((target_lufs - loudness) / 20)
+    peak = np.abs(samples).max() * gain
+    ceiling = 10 ** (peak_db / 20)
+    if peak > ceiling:
+        gain *= ceiling / peak
+    return samples * gain
+
+
+def _moving_average(values, width):
+    if width <= 1:
+        return values
+    padded = np.concatenate([np.full(width // 2, values[0]), values, np.full(width - width // 2 - 1, values[-1])])
+    cumulative = np.concatenate([[0.0], np.cumsum(padded)])
+    return (cumulative[width:] - cumulative[:-width]) / width
+
+
+def duck_gain(voice, sample_rate=SAMPLE_RATE, duck_db=DUCK_DB, attack=DUCK_ATTACK, release=DUCK_RELEASE):
+    """
+    Sidechain gain curve for the music, computed from the voice envelope in
+    10 ms frames: full ducking while the voice is above threshold, held
+    through short pauses, with smoothed transitions.
+    Returns a per-sample gain array.
+    """
+    hop = sample_rate // 100
+    frames = len(voice) // hop + 1
+    padded = np.zeros((frames * hop, voice.shape[1]), dtype=np.float32)
+    padded[:len(voice)] = voice
+    rms = np.sqrt((padded.reshape(frames, hop, -1) ** 2).mean(axis=(1, 2)))
+    active = 20 * np.log10(np.maximum(rms, 1e-9)) > VOICE_THRESHOLD_DB
+
+    # Hold the duck through gaps shorter than the release time
+    hold = max(1, int(release * 100))
+    active = _moving_average(active.astype(np.float32), hold) > 0
+
+    target = np.where(active, 10 ** (duck_db / 20), 1.0)
+    smooth = _moving_average(target, max(1, int(attack * 100)))
+    per_sample = np.interp(np.arange(len(voice)) / hop, np.arange(frames), smooth)
+    return per_sample.astype(np.float32)
+
+
+def fit_length(music, length):
+    """
+    Loops or trims music to `length` samples.
+    """
+    if len(music) >= length:
+        return music[:length]
+    repeats = -(-length // len(music))
+    return np.tile(music, (repeats, 1))[:length]
+
+
+def mix_key(voice_path, music_path, params):
+    parts = {"params": params}
+    for name, path in (("voice", voice_path), ("music", music_path)):
+        if path:
+            stat = os.stat(path)
+            parts[name] = [os.path.abspath(path), stat.st_size, stat.st_mtime]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def evict_mixes(cache_dir=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BYTES, keep=()):
+    """
+    Deletes the least recently used cached mixes until the cache fits in
+    `max_bytes`. Paths in `keep` are never deleted. Returns the number of
+    mixes removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(".wav") and os.path.isfile(path):
+            entries.append((os.path.getmtime(path), path, os.path.getsize(path)))
+
+    total = sum(entry[2] for entry in entries)
+    removed = 0
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def prepare_audio(voice_path, music_path=None, target_lufs=TARGET_LUFS, music_lufs=MUSIC_LUFS,
+                  duck_db=DUCK_DB, cache_dir=AUDIO_CACHE_DIR, output_path=None, normalize=True):
+    """
+    Produces the final soundtrack before rendering: the voiceover normalized
+    to `target_lufs` (left as is without `normalize`), optionally over
+    background music normalized to `music_lufs` and ducked under the voice.
+    The result is a WAV cached by its inputs, ready to hand to the muxer;
+    the cache is kept under AUDIO_CACHE_BYTES.
+    Pass `output_path` to write to a specific file instead of the cache.
+    """
+    cached = output_path is None
+    if cached:
+        params = {"target": target_lufs if normalize else None, "music": music_lufs, "duck": duck_db,
+                  "rate": SAMPLE_RATE}
+        os.makedirs(cache_dir, exist_ok=True)
+        output_path = os.path.join(cache_dir, mix_key(voice_path, music_path, params) + ".wav")
+        if os.path.exists(output_path):
+            # Marks the mix as recently used for evict_mixes
+            os.utime(output_path)
+            return output_path
+
+    voice = decode_audio(voice_path)
+    if normalize:
+        voice = normalize_loudness(voice, target_lufs)
+    mix = voice
+    if music_path:
+        music = normalize_loudness(fit_length(decode_audio(music_path), len(voice)), music_lufs)
+        mix = voice + music * duck_gain(voice, duck_db=duck_db)[:, None]
+        # Keep the summed track under the peak ceiling
+        peak = np.abs(mix).max()
+        ceiling = 10 ** (TRUE_PEAK / 20)
+        if peak > ceiling:
+            mix = mix * (ceiling / peak)
+
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    write_wav(temp_path, mix)
+    os.replace(temp_path, output_path)
+    if cached:
+        evict_mixes(cache_dir, keep=[output_path])
+    return output_path
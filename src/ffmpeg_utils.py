@@ -0,0 +1,56 @@
+import os
+import subprocess
+
+
+def get_ffmpeg_exe():
+    """
+    Returns the ffmpeg binary bundled with MoviePy (imageio-ffmpeg), or
+    'ffmpeg' from the PATH.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+
+def run_ffmpeg(args):
+    """
+    Runs ffmpeg quietly, raising CalledProcessError on failure.
+    Returns the CompletedProcess.
+    """
+    cmd = [get_ffmpeg_exe(), "-loglevel", "error", "-y"] + list(args)
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+
+def mux_audio(video_path, audio_path, output_path, audio_bitrate="192k"):
+    """
+    Copies the video stream and encodes the audio track to AAC alongside it.
+    """
+    run_ffmpeg(["-i", video_path, "-i", audio_path,
+                "-map", "0:v:0", "-map", "1:a:0",
+                "-c:v", "copy", "-c:a", "aac", "-b:a", audio_bitrate,
+                "-shortest", "-movflags", "+faststart", output_path])
+    return output_path
+
+
+def concat_videos(paths, output_path, audio_path=None, audio_bitrate="192k"):
+    """
+    Joins video files encoded with identical settings without re-encoding
+    (concat demuxer, stream copy), optionally muxing one continuous audio
+    track over the result. Each file must start on a keyframe.
+    """
+    list_path = f"{output_path}.concat.txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    args = ["-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0",
+                 "-c:a", "aac", "-b:a", audio_bitrate, "-shortest"]
+    try:
+        run_ffmpeg(args + ["-c:v", "copy", "-movflags", "+faststart", output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
@@ -0,0 +1,87 @@
+import os
+import functools
+from PIL import ImageFont
+
+# Preferred fonts, in order. Bold faces first; the same list is searched on
+# macOS, Linux and Windows.
+FONT_NAMES = [
+    "Arial Bold.ttf", "Arial-Bold.ttf", "arialbd.ttf",
+    "Helvetica-Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf",
+    "NotoSans-Bold.ttf", "FreeSansBold.ttf",
+    "Arial.ttf", "arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf",
+]
+
+FONT_DIRS = [
+    "/System/Library/Fonts/Supplemental",
+    "/System/Library/Fonts",
+    "/Library/Fonts",
+    "~/Library/Fonts",
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "~/.fonts",
+    "~/.local/share/fonts",
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def find_font_path():
+    """
+    Locates a TrueType font on this machine. FONT_PATH in the environment
+    takes precedence. Returns None if nothing suitable is installed.
+    """
+    override = os.getenv("FONT_PATH")
+    if override and os.path.exists(override):
+        return override
+
+    found = {}
+    wanted = {name.lower() for name in FONT_NAMES}
+    for directory in FONT_DIRS:
+        directory = os.path.expanduser(directory)
+        if not os.path.isdir(directory):
+            continue
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.lower() in wanted and name.lower() not in found:
+                    found[name.lower()] = os.path.join(root, name)
+
+    for name in FONT_NAMES:
+        if name.lower() in found:
+            return found[name.lower()]
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def get_font(size):
+    """
+    Returns a cached font at `size`, falling back to Pillow's default font.
+    """
+    path = find_font_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has no sized default font
+        return ImageFont.load_default()
+
+
+def wrap_text(text, font, max_width):
+    """
+    Greedily wraps `text` into lines no wider than `max_width` pixels.
+    """
+    lines = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and font.getlength(candidate) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
@@ -0,0 +1,207 @@
+import json
+import os
+import re
+import time
+import hashlib
+from datetime import datetime
+from moviepy import VideoFileClip
+
+LIBRARY_FILE = "outputs/footage_library.json"
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".mkv", ".webm"}
+
+# Clips used within this window are skipped while other matches exist.
+RECENT_HOURS = 72
+
+IGNORED_TAGS = {"clip", "video", "stock", "footage", "final", "hd", "uhd", "4k", "1080p", "720p", "mp4", "mov"}
+
+
+def tokenize_tags(text):
+    """
+    Splits a path fragment or phrase into lowercase keyword tags.
+    """
+    tokens = re.findall(r"[a-z]+", text.lower())
+    return {t for t in tokens if len(t) > 2 and t not in IGNORED_TAGS}
+
+
+def get_orientation(width, height):
+    if width > height:
+        return "landscape"
+    if height > width:
+        return "portrait"
+    return "square"
+
+
+def probe_clip(path):
+    """
+    Reads duration and resolution of a clip once, at ingest time.
+    """
+    clip = VideoFileClip(path, audio=False)
+    try:
+        width, height = clip.size
+        return {"duration": clip.duration, "width": width, "height": height}
+    finally:
+        clip.close()
+
+
+class FootageLibrary:
+    """
+    Local footage library with an inverted keyword index.
+    Clip metadata lives in LIBRARY_FILE; the keyword index is rebuilt on load.
+    """
+    def __init__(self, path=LIBRARY_FILE):
+        self.path = path
+        self.clips = {}
+        self.index = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self.clips = json.load(f).get("clips", {})
+                except ValueError:
+                    self.clips = {}
+        for clip_id, clip in self.clips.items():
+            self._index_clip(clip_id, clip)
+
+    def _index_clip(self, clip_id, clip):
+        for tag in clip["tags"]:
+            self.index.setdefault(tag, set()).add(clip_id)
+
+    def _unindex_clip(self, clip_id, clip):
+        for tag in clip["tags"]:
+            ids = self.index.get(tag)
+            if ids:
+                ids.discard(clip_id)
+                if not ids:
+                    del self.index[tag]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write-then-rename so concurrent renders never see a partial file
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"clips": self.clips}, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def __len__(self):
+        return len(self.clips)
+
+    def add_clip(self, path, tags=None):
+        """
+        Adds (or refreshes) a single clip. Tags come from its directory and
+        file name, an optional `<clip>.txt` sidecar, and `tags`.
+        Returns the clip ID.
+        """
+        path = os.path.abspath(path)
+        clip_id = hashlib.sha1(path.encode()).hexdigest()[:16]
+        stat = os.stat(path)
+
+        existing = self.clips.get(clip_id)
+        if existing and existing["mtime"] == stat.st_mtime and existing["size"] == stat.st_size and not tags:
+            return clip_id
+
+        all_tags = tokenize_tags(os.path.splitext(os.path.basename(path))[0])
+        all_tags |= tokenize_tags(os.path.basename(os.path.dirname(path)))
+        sidecar = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(sidecar):
+            with open(sidecar, "r") as f:
+                all_tags |= tokenize_tags(f.read())
+        for tag in tags or []:
+            all_tags |= tokenize_tags(tag)
+
+        meta = probe_clip(path)
+        if existing:
+            self._unindex_clip(clip_id, existing)
+        clip = {
+            "path": path,
+            "duration": meta["duration"],
+            "width": meta["width"],
+            "height": meta["height"],
+            "orientation": get_orientation(meta["width"], meta["height"]),
+            "tags": sorted(all_tags),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "last_used": existing.get("last_used") if existing else None,
+            "added_at": existing.get("added_at") if existing else datetime.now().isoformat()
+        }
+        self.clips[clip_id] = clip
+        self._index_clip(clip_id, clip)
+        return clip_id
+
+    def ingest_directory(self, directory, tags=None):
+        """
+        Recursively ingests every video file under `directory`.
+        Unchanged clips are not re-probed. Clips whose files are gone are dropped.
+        Returns the number of clips added or refreshed.
+        """
+        before = {cid: (c["mtime"], c["size"]) for cid, c in self.clips.items()}
+        count = 0
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in VIDEO_EXTENSIONS:
+                    continue
+                try:
+                    clip_id = self.add_clip(os.path.join(root, name), tags=tags)
+                except Exception as e:
+                    print(f"Warning: Could not ingest {name}: {e}")
+                    continue
+                clip = self.clips[clip_id]
+                if before.get(clip_id) != (clip["mtime"], clip["size"]):
+                    count += 1
+
+        for clip_id, clip in list(self.clips.items()):
+            if not os.path.exists(clip["path"]):
+                self._unindex_clip(clip_id, clip)
+                del self.clips[clip_id]
+
+        self.save()
+        return count
+
+    def find(self, keyword, orientation=None, min_duration=0):
+        """
+        Returns IDs of clips matching every tag in `keyword`.
+        """
+        tags = tokenize_tags(keyword)
+        if not tags:
+            return []
+        ids = None
+        for tag in tags:
+            matches = self.index.get(tag, set())
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                return []
+        return [
+            cid for cid in ids
+            if self.clips[cid]["duration"] >= min_duration
+            and (orientation is None or self.clips[cid]["orientation"] == orientation)
+        ]
+
+    def pick(self, keyword, exclude=(), orientation=None, min_duration=0, recent_hours=RECENT_HOURS):
+        """
+        Picks the least recently used clip for `keyword`, skipping clips in
+        `exclude` and, while alternatives exist, clips used in the last
+        `recent_hours`. Returns the clip record or None.
+        """
+        ids = [cid for cid in self.find(keyword, orientation, min_duration) if cid not in exclude]
+        if not ids:
+            return None
+
+        cutoff = time.time() - recent_hours * 3600
+        def last_used(cid):
+            return self.clips[cid]["last_used"] or 0
+
+        fresh = [cid for cid in ids if last_used(cid) < cutoff]
+        clip_id = min(fresh or ids, key=lambda cid: (last_used(cid), cid))
+        return dict(self.clips[clip_id], id=clip_id)
+
+    def mark_used(self, clip_ids):
+        now = time.time()
+        for clip_id in clip_ids:
+            if clip_id in self.clips:
+                self.clips[clip_id]["last_used"] = now
+        self.save()
+
+
+if __name__ == "__main__":
+    # Test
+    library = FootageLibrary()
+    # library.ingest_directory("footage/")
+    print(f"{len(library)} clips, {len(library.index)} keywords")
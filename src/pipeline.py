@@ -0,0 +1,307 @@
+import json
+import os
+import sys
+import shutil
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTIFACT_DIR = "outputs/artifacts"
+BUILD_DIR = "outputs/builds"
+
+# Bump when a stage's builder changes in a way that invalidates old artifacts.
+STAGE_VERSIONS = {
+    "topic": 1,
+    "script": 1,
+    "voiceover": 1,
+    "audio_mix": 1,
+    "footage_plan": 1,
+    "clip": 1,
+    "caption_image": 1,
+    "captions": 1,
+    "final": 1,
+    "thumbnail": 1,
+}
+
+
+def hash_inputs(inputs):
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def file_fingerprint(path):
+    """
+    Identifies an external input file by path, size and modification time,
+    which is much cheaper than hashing a large video.
+    """
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _digest(value):
+    # Long values (scripts, prompts) are summarised in build state files.
+    if isinstance(value, str) and len(value) > 80:
+        return "sha1:" + hashlib.sha1(value.encode()).hexdigest()[:12]
+    return value
+
+
+class ArtifactStore:
+    """
+    Content-addressed store: every artifact lives at <root>/<stage>/<key><ext>
+    next to a <key>.json manifest recording the inputs it was built from.
+    """
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+
+    def directory(self, stage):
+        directory = os.path.join(self.root, stage)
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def path(self, stage, key, ext=""):
+        return os.path.join(self.directory(stage), key + ext)
+
+    def get(self, stage, key):
+        manifest_path = os.path.join(self.root, stage, key + ".json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if not os.path.exists(manifest["output"]):
+            return None
+        return manifest
+
+    def put(self, stage, key, inputs, output):
+        manifest = {
+            "stage": stage,
+            "key": key,
+            "inputs": {k: _digest(v) for k, v in inputs.items()},
+            "output": output,
+            "built_at": datetime.now().isoformat()
+        }
+        with open(self.path(stage, key, ".json"), "w") as f:
+            json.dump(manifest, f, indent=4)
+        return manifest
+
+
+class PipelineBuild:
+    """
+    Runs pipeline stages for one job, skipping any stage whose artifact for
+    the current inputs already exists. Keeps the inputs of the job's last
+    build so it can explain why a stage was rebuilt.
+    """
+    def __init__(self, job_id, store=None, force=()):
+        self.job_id = job_id
+        self.store = store or ArtifactStore()
+        self.force = set(force)
+        self.state_path = os.path.join(BUILD_DIR, f"{job_id}.json")
+        self.previous = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                try:
+                    self.previous = json.load(f).get("stages", {})
+                except ValueError:
+                    self.previous = {}
+        self.stages = {}
+        self.report = []
+
+    def _explain(self, name, inputs):
+        prev = self.previous.get(name)
+        if prev is None:
+            return "first build"
+        digested = {k: _digest(v) for k, v in inputs.items()}
+        changed = sorted(k for k in set(digested) | set(prev["inputs"]) if digested.get(k) != prev["inputs"].get(k))
+        if changed:
+            return "changed: " + ", ".join(changed)
+        return "artifact missing"
+
+    def step(self, name, inputs, build, ext="", stage=None):
+        """
+        Builds (or reuses) one artifact. `build(output_path)` is called only
+        when no artifact exists for these inputs. Returns (output_path, key).
+        """
+        stage = stage or name
+        inputs = dict(inputs, _version=STAGE_VERSIONS.get(stage, 1))
+        key = hash_inputs({"stage": stage, "inputs": inputs})
+        manifest = self.store.get(stage, key)
+
+        if manifest and name not in self.force and stage not in self.force:
+            output = manifest["output"]
+            self.report.append({"stage": name, "status": "cached", "reason": "inputs unchanged", "key": key})
+        else:
+            reason = "forced" if manifest else self._explain(name, inputs)
+            print(f"[build] {name}: rebuilding ({reason})")
+            output = self.store.path(stage, key, ext)
+            build(output)
+            self.store.put(stage, key, inputs, output)
+            self.report.append({"stage": name, "status": "rebuilt", "reason": reason, "key": key})
+
+        self.stages[name] = {"key": key, "inputs": {k: _digest(v) for k, v in inputs.items()}}
+        return output, key
+
+    def save(self):
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        with open(self.state_path, "w") as f:
+            json.dump({
+                "job_id": self.job_id,
+                "built_at": datetime.now().isoformat(),
+                "stages": self.stages,
+                "report": self.report
+            }, f, indent=4)
+
+    def summary(self):
+        lines = []
+        for entry in self.report:
+            lines.append(f"{entry['stage']:<20} {entry['status']:<8} {entry['reason']}")
+        return "\n".join(lines)
+
+
+def _write_text(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def _read_text(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+def run_pipeline(job, store=None, force=()):
+    """
+    Builds a job through topic -> script -> voiceover -> audio mix ->
+    footage plan -> normalized clips -> captions -> final encode -> thumbnail.
+
+    `job` keys: id, topic, and optionally script (use this text instead of
+    generating one), voice_id, music_path, keywords, use_library, thumbnail_text, fps,
+    height, video_path / thumbnail_path (copies of the final artifacts),
+    gemini_api_key, elevenlabs_api_key.
+    Returns (outputs, build) where outputs maps stage names to artifact paths.
+    """
+    # Imported here so the build graph itself can be used without the
+    # media and API dependencies.
+    from moviepy import AudioFileClip, VideoFileClip
+    from src.script_writer import generate_script
+    from src.voiceover import generate_voiceover
+    from src.video_gen import plan_stock_footage, normalize_clip, build_captions, render_caption_image, compose_video
+    from src.thumbnail_gen import generate_thumbnail
+    from src.audio_mix import prepare_audio
+    from src.ffmpeg_utils import mux_audio
+
+    build = PipelineBuild(job.get("id") or hash_inputs({"topic": job["topic"]}), store=store, force=force)
+    fps = job.get("fps", 24)
+    height = job.get("height", 1080)
+    outputs = {}
+
+    topic_path, topic_key = build.step(
+        "topic", {"topic": job["topic"]},
+        lambda out: _write_text(out, job["topic"]), ".txt")
+
+    if job.get("script"):
+        script_inputs = {"script": job["script"]}
+        build_script = lambda out: _write_text(out, job["script"])
+    else:
+        script_inputs = {"topic": topic_key}
+        build_script = lambda out: _write_text(out, generate_script(job["topic"], api_key=job.get("gemini_api_key")))
+    script_path, script_key = build.step("script", script_inputs, build_script, ".txt")
+    script_text = _read_text(script_path)
+
+    voice_id = job.get("voice_id", "pNInz6obpgDQGcFmaJgB")
+    audio_path, audio_key = build.step(
+        "voiceover", {"script": script_key, "voice_id": voice_id},
+        lambda out: generate_voiceover(script_text, out, voice_id=voice_id, api_key=job.get("elevenlabs_api_key")),
+        ".mp3")
+
+    music_path = job.get("music_path")
+    mix_path, mix_key = build.step(
+        "audio_mix", {"voiceover": audio_key, "music": file_fingerprint(music_path) if music_path else None},
+        lambda out: prepare_audio(audio_path, music_path, output_path=out), ".wav")
+
+    audio = AudioFileClip(mix_path)
+    duration = audio.duration
+
+    keywords = job.get("keywords") or []
+    def build_plan(out):
+        segments = plan_stock_footage(duration, keywords, use_library=job.get("use_library", True),
+                                      download_dir=build.store.directory("footage"))
+        with open(out, "w") as f:
+            json.dump(segments, f, indent=4)
+    plan_path, plan_key = build.step(
+        "footage_plan", {"voiceover": audio_key, "keywords": keywords, "use_library": job.get("use_library", True)},
+        build_plan, ".json")
+    with open(plan_path, "r") as f:
+        segments = json.load(f)
+
+    clip_paths, clip_keys = [], []
+    for i, seg in enumerate(segments):
+        source = seg.get("url") or file_fingerprint(seg["path"])
+        path, key = build.step(
+            f"clip[{i}]", {"source": source, "start": seg["start"], "duration": seg["duration"], "height": height, "fps": fps},
+            lambda out, seg=seg: normalize_clip(seg, out, height=height, fps=fps), ".mp4", stage="clip")
+        clip_paths.append(path)
+        clip_keys.append(key)
+
+    clips = [VideoFileClip(p) for p in clip_paths]
+    width = clips[0].w if clips else 1920
+
+    # Each caption image is its own artifact, so editing one sentence only
+    # re-renders that sentence.
+    captions = build_captions(script_text, duration)
+    caption_keys = []
+    for i, caption in enumerate(captions):
+        caption["image"], key = build.step(
+            f"caption[{i}]", {"text": caption["text"], "width": width},
+            lambda out, text=caption["text"]: render_caption_image(text, width, out), ".png", stage="caption_image")
+        caption_keys.append(key)
+
+    def build_caption_track(out):
+        with open(out, "w") as f:
+            json.dump(captions, f, indent=4)
+    captions_path, captions_key = build.step(
+        "captions", {"images": caption_keys, "timings": [(c["start"], c["duration"]) for c in captions]},
+        build_caption_track, ".json")
+
+    def build_final(out):
+        silent_path = f"{os.path.splitext(out)[0]}.video.mp4"
+        compose_video(clips, captions, duration).write_videofile(silent_path, fps=fps, codec="libx264", audio=False)
+        mux_audio(silent_path, mix_path, out)
+        os.remove(silent_path)
+    final_path, final_key = build.step(
+        "final", {"clips": clip_keys, "captions": captions_key, "audio": mix_key, "fps": fps},
+        build_final, ".mp4")
+
+    # Drawn over the best keyframe of the final video, so it is rebuilt
+    # whenever the video is
+    thumbnail_text = job.get("thumbnail_text") or job["topic"][:30].upper()
+    thumbnail_path, _ = build.step(
+        "thumbnail", {"text": thumbnail_text, "video": final_key},
+        lambda out: generate_thumbnail(thumbnail_text, out, video_path=final_path), ".png")
+
+    for clip in clips:
+        clip.close()
+    audio.close()
+
+    outputs.update({"topic": topic_path, "script": script_path, "voiceover": audio_path,
+                    "footage_plan": plan_path, "captions": captions_path,
+                    "video": final_path, "thumbnail": thumbnail_path})
+    for key, target in (("video", job.get("video_path")), ("thumbnail", job.get("thumbnail_path"))):
+        if target:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            shutil.copyfile(outputs[key], target)
+            outputs[key] = target
+
+    build.save()
+    return outputs, build
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.pipeline job.json
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.pipeline job.json")
+    else:
+        with open(sys.argv[1], "r") as f:
+            job = json.load(f)
+        outputs, build = run_pipeline(job)
+        print(build.summary())
+        print(f"Video: {outputs['video']}")
@@ -0,0 +1,186 @@
+import os
+import json
+import bisect
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from src.ffmpeg_utils import run_ffmpeg
+from src.renderer import OUTPUT_PROFILES, render_caption_rgba, overlay_rgba
+
+PROXY_DIR = "outputs/proxies"
+
+# Proxies are small and sparse: enough to judge framing and cuts, cheap to
+# decode and to keep on disk.
+PROXY_HEIGHT = 180
+PROXY_FPS = 6
+
+# Disk budget for cached preview proxies; the least recently used go first.
+PROXY_CACHE_BYTES = 1024 ** 3
+
+
+def proxy_key(segment, height=PROXY_HEIGHT, fps=PROXY_FPS):
+    path = os.path.abspath(segment["path"])
+    stat = os.stat(path)
+    parts = [path, stat.st_size, stat.st_mtime, segment["start"], segment["duration"], height, fps]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()[:20]
+
+
+def build_proxy(segment, proxy_dir=PROXY_DIR, height=PROXY_HEIGHT, fps=PROXY_FPS):
+    """
+    Decodes a planned segment once, at low resolution and frame rate, into
+    a raw RGB file (<key>.rgb) with a JSON sidecar describing its shape.
+    Returns the sidecar path. Existing proxies are reused.
+    """
+    os.makedirs(proxy_dir, exist_ok=True)
+    stem = os.path.join(proxy_dir, proxy_key(segment, height, fps))
+    meta_path = stem + ".json"
+    if os.path.exists(meta_path):
+        # Marks the proxy as recently used for evict_proxies
+        os.utime(meta_path)
+        return meta_path
+
+    width = proxy_width(segment["path"], height)
+    temp_path = f"{stem}.{os.getpid()}.tmp"
+    # ffmpeg writes raw frames straight to disk; nothing passes through Python
+    run_ffmpeg(["-ss", str(segment["start"]), "-t", str(segment["duration"]), "-i", segment["path"],
+                "-an", "-vf", f"fps={fps},scale={width}:{height}", "-f", "rawvideo", "-pix_fmt", "rgb24", temp_path])
+    frames = os.path.getsize(temp_path) // (width * height * 3)
+    os.replace(temp_path, stem + ".rgb")
+    with open(meta_path, "w") as f:
+        json.dump({"width": width, "height": height, "fps": fps, "frames": frames,
+                   "source": segment["path"], "start": segment["start"], "duration": segment["duration"]}, f)
+    return meta_path
+
+
+def evict_proxies(proxy_dir=PROXY_DIR, max_bytes=PROXY_CACHE_BYTES, keep=()):
+    """
+    Deletes proxies whose source file is gone, then the least recently used
+    until the cache fits in `max_bytes`. Sidecar paths in `keep` are never
+    deleted. Returns the number of proxies removed.
+    """
+    if not os.path.isdir(proxy_dir):
+        return 0
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for name in os.listdir(proxy_dir):
+        if not name.endswith(".json"):
+            continue
+        meta_path = os.path.join(proxy_dir, name)
+        rgb_path = os.path.splitext(meta_path)[0] + ".rgb"
+        try:
+            with open(meta_path, "r") as f:
+                source = json.load(f).get("source")
+            size = os.path.getsize(rgb_path) if os.path.exists(rgb_path) else 0
+            entries.append((os.path.getmtime(meta_path), meta_path, rgb_path, size, source))
+        except (OSError, ValueError):
+            continue
+
+    total = sum(entry[3] for entry in entries)
+    removed = 0
+    # Orphans first, then oldest first
+    for _, meta_path, rgb_path, size, source in sorted(entries, key=lambda e: (bool(e[4] and os.path.exists(e[4])), e[0])):
+        orphan = not (source and os.path.exists(source))
+        if os.path.abspath(meta_path) in keep or (not orphan and total <= max_bytes):
+            continue
+        try:
+            os.remove(meta_path)
+            if os.path.exists(rgb_path):
+                os.remove(rgb_path)
+        except OSError:
+            # Still mapped by a timeline on a platform that won't unlink it
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def proxy_width(path, height):
+    """
+    Aspect-correct width for a source scaled to `height`, rounded to an
+    even number.
+    """
+    from moviepy import VideoFileClip
+
+    clip = VideoFileClip(path, audio=False)
+    try:
+        src_w, src_h = clip.size
+    finally:
+        clip.close()
+    return int(round(src_w * height / src_h / 2)) * 2
+
+
+class Proxy:
+    """
+    A proxy opened as a read-only memory map. Frames are views into the
+    mapped file, so a seek costs a page fault, not a decode.
+    """
+    def __init__(self, meta_path):
+        with open(meta_path, "r") as f:
+            self.meta = json.load(f)
+        shape = (self.meta["frames"], self.meta["height"], self.meta["width"], 3)
+        rgb_path = os.path.splitext(meta_path)[0] + ".rgb"
+        self.frames = np.memmap(rgb_path, dtype=np.uint8, mode="r", shape=shape) if shape[0] else np.zeros(shape, np.uint8)
+
+    def frame(self, t):
+        if not len(self.frames):
+            return None
+        index = min(len(self.frames) - 1, max(0, int(t * self.meta["fps"])))
+        return self.frames[index]
+
+
+class ProxyTimeline:
+    """
+    Low-res stand-in for a planned render: the footage plan's proxies laid
+    end to end with captions burned in, for scrubbing before rendering.
+    """
+    def __init__(self, segments, captions=(), proxy_dir=PROXY_DIR, height=PROXY_HEIGHT, fps=PROXY_FPS, workers=4):
+        self.segments = segments
+        self.height = height
+        self.fps = fps
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            metas = list(pool.map(lambda seg: build_proxy(seg, proxy_dir, height, fps), segments))
+        self.proxies = [Proxy(meta) for meta in metas]
+        evict_proxies(proxy_dir, keep=metas)
+
+        self.starts = []
+        t = 0.0
+        for seg in segments:
+            self.starts.append(t)
+            t += seg["duration"]
+        self.duration = t
+
+        # Clips are centered on the widest one's canvas, as in the render
+        self.width = max((p.meta["width"] for p in self.proxies), default=height * 16 // 9)
+        self.captions = []
+        layout = dict(OUTPUT_PROFILES["landscape"]["caption"])
+        layout["font_size"] = max(8, int(layout["font_size"] * height / 1080))
+        profile = {"width": self.width, "height": height, "caption": layout}
+        for caption in captions:
+            rgba, position = render_caption_rgba(caption["text"], profile)
+            self.captions.append((caption["start"], caption["start"] + caption["duration"], rgba, position))
+
+    def segment_at(self, t):
+        """
+        Index of the segment showing at timeline time `t`.
+        """
+        return max(0, bisect.bisect_right(self.starts, t) - 1)
+
+    def frame_at(self, t, captions=True):
+        """
+        The proxy frame at timeline time `t`, with its caption if any.
+        Returns an RGB array; a mapped view when nothing is drawn on it.
+        """
+        i = self.segment_at(t)
+        frame = self.proxies[i].frame(t - self.starts[i]) if self.proxies else None
+        if frame is None:
+            frame = np.zeros((self.height, self.width, 3), np.uint8)
+        caption = next((c for c in self.captions if c[0] <= t < c[1]), None) if captions else None
+        if frame.shape[1] == self.width and caption is None:
+            return frame
+
+        canvas = np.zeros((self.height, self.width, 3), np.uint8)
+        x0 = (self.width - frame.shape[1]) // 2
+        canvas[:, x0:x0 + frame.shape[1]] = frame
+        if caption:
+            overlay_rgba(canvas, caption[2], caption[3])
+        return canvas
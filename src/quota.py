@@ -0,0 +1,111 @@
+import json
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+QUOTA_FILE = "outputs/quota.json"
+
+# YouTube Data API quota resets at midnight Pacific Time.
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+DEFAULT_DAILY_QUOTA = 10000
+
+# Units charged per API call (https://developers.google.com/youtube/v3/determine_quota_cost)
+UNIT_COSTS = {
+    "videos.insert": 1600,
+    "thumbnails.set": 50,
+    "videos.list": 1,
+    "channels.list": 1,
+}
+
+
+def quota_day(now=None):
+    """
+    Returns the quota day (YYYY-MM-DD in Pacific Time) that `now` falls in.
+    Naive datetimes are treated as local time, like the rest of the queue.
+    """
+    now = now or datetime.now()
+    return now.astimezone(QUOTA_TIMEZONE).date().isoformat()
+
+
+def next_reset(now=None):
+    """
+    Returns the next quota reset as a naive local datetime.
+    """
+    now = (now or datetime.now()).astimezone(QUOTA_TIMEZONE)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=QUOTA_TIMEZONE)
+    return midnight.astimezone().replace(tzinfo=None)
+
+
+class QuotaLedger:
+    """
+    Tracks units spent per quota pool for the current quota day.
+
+    Quota belongs to the Google Cloud project behind a set of OAuth client
+    secrets, so channels authorised through the same project share a pool.
+    """
+    def __init__(self, path=QUOTA_FILE):
+        self.path = path
+        self.pools = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self.pools = json.load(f)
+                except ValueError:
+                    self.pools = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.pools, f, indent=4)
+
+    def _pool(self, pool, limit=None, now=None):
+        entry = self.pools.setdefault(pool, {"limit": limit or DEFAULT_DAILY_QUOTA, "day": quota_day(now), "used": 0, "calls": {}})
+        if limit:
+            entry["limit"] = limit
+        if entry["day"] != quota_day(now):
+            # A new quota day has started since the last call
+            entry.update({"day": quota_day(now), "used": 0, "calls": {}})
+        return entry
+
+    def remaining(self, pool, limit=None, now=None):
+        entry = self._pool(pool, limit, now)
+        return max(0, entry["limit"] - entry["used"])
+
+    def can_afford(self, pool, operation, limit=None, now=None):
+        return self.remaining(pool, limit, now) >= UNIT_COSTS[operation]
+
+    def spend(self, pool, operation, limit=None, now=None):
+        """
+        Records one API call against a pool and saves the ledger.
+        """
+        entry = self._pool(pool, limit, now)
+        entry["used"] += UNIT_COSTS[operation]
+        entry["calls"][operation] = entry["calls"].get(operation, 0) + 1
+        self.save()
+
+    def exhaust(self, pool, now=None):
+        """
+        Marks a pool as spent for the day, e.g. after the API reports
+        quotaExceeded for calls made outside this ledger.
+        """
+        entry = self._pool(pool, now=now)
+        entry["used"] = max(entry["used"], entry["limit"])
+        self.save()
+
+    def status(self, now=None):
+        """
+        Returns remaining units per pool, for display.
+        """
+        rows = []
+        for pool in sorted(self.pools):
+            entry = self._pool(pool, now=now)
+            rows.append({
+                "pool": pool,
+                "day": entry["day"],
+                "limit": entry["limit"],
+                "used": entry["used"],
+                "remaining": max(0, entry["limit"] - entry["used"]),
+                "uploads_left": max(0, entry["limit"] - entry["used"]) // UNIT_COSTS["videos.insert"],
+                "resets_at": next_reset(now).isoformat(timespec="minutes")
+            })
+        return rows
@@ -0,0 +1,174 @@
+import bisect
+import numpy as np
+from PIL import Image
+from src.proxy_cache import Proxy, build_proxy, PROXY_DIR
+
+# Weight of frame-to-frame motion against edge detail when scoring pixels.
+MOTION_WEIGHT = 2.0
+
+# Penalty (in normalized score) for a window at the frame edge versus the
+# center, so flat frames stay centered instead of jumping around.
+CENTER_BIAS = 0.15
+
+# Pan smoothing: averaging window, and the fastest the crop may move, as a
+# fraction of the source width per second.
+SMOOTH_SECONDS = 1.0
+MAX_PAN_PER_SECOND = 0.12
+
+
+def is_portrait(profile):
+    return profile["height"] > profile["width"]
+
+
+def window_fraction(src_w, src_h, size):
+    """
+    Width of the crop window as a fraction of the source width, for an
+    output of `size` (w, h). 1.0 when the source is no wider than the output.
+    """
+    return min(1.0, src_h * size[0] / size[1] / src_w)
+
+
+def saliency_columns(frames):
+    """
+    Per-frame column profile of "interesting" pixels: edge detail plus
+    motion since the previous frame, summed down each column.
+    `frames` is (N, h, w, 3) uint8; returns (N, w) float32.
+    """
+    gray = frames.astype(np.float32).mean(axis=3)
+    edges = np.zeros_like(gray)
+    edges[:, :, 1:] += np.abs(np.diff(gray, axis=2))
+    edges[:, 1:, :] += np.abs(np.diff(gray, axis=1))
+    motion = np.zeros_like(gray)
+    if len(gray) > 1:
+        motion[1:] = np.abs(np.diff(gray, axis=0))
+        motion[0] = motion[1]
+    edges /= edges.mean() + 1e-6
+    motion /= motion.mean() + 1e-6
+    return (edges + MOTION_WEIGHT * motion).sum(axis=1)
+
+
+def smooth_track(centers, fps, lo, hi):
+    """
+    Smooths per-frame window centers into a steady pan: a moving average,
+    then a cap on pan speed, then clamping so the window stays in frame.
+    """
+    width = max(1, int(round(SMOOTH_SECONDS * fps)))
+    if width > 1 and len(centers) > 1:
+        padded = np.concatenate([np.full(width // 2, centers[0]), centers, np.full(width - width // 2 - 1, centers[-1])])
+        centers = np.convolve(padded, np.ones(width) / width, mode="valid")
+    step = MAX_PAN_PER_SECOND / fps
+    smoothed = np.empty_like(centers)
+    current = centers[0]
+    for i, target in enumerate(centers):
+        current += np.clip(target - current, -step, step)
+        smoothed[i] = current
+    return np.clip(smoothed, lo, hi)
+
+
+def crop_track(segment, size=(1080, 1920), proxy_dir=PROXY_DIR):
+    """
+    Picks a crop window per proxy frame of a planned segment for an output
+    of `size` and smooths it over time. The proxy is built in `proxy_dir`.
+    Returns {"fps", "times", "centers"} with centers as fractions of the
+    source width.
+    """
+    proxy = Proxy(build_proxy(segment, proxy_dir))
+    fps = proxy.meta["fps"]
+    frames = np.asarray(proxy.frames)
+    fraction = window_fraction(proxy.meta["width"], proxy.meta["height"], size)
+    if not len(frames) or fraction >= 1.0:
+        return {"fps": fps, "times": [0.0], "centers": [0.5]}
+
+    columns = saliency_columns(frames)
+    w = columns.shape[1]
+    window = max(1, int(round(w * fraction)))
+    # Columns near the middle of the window count most, so the action ends
+    # up centered in the crop rather than just inside it
+    kernel = (np.hanning(window) + 0.25).astype(np.float32)
+    scores = np.lib.stride_tricks.sliding_window_view(columns, window, axis=1) @ kernel
+    scores /= scores.max(axis=1, keepdims=True) + 1e-6
+    centers = (np.arange(scores.shape[1]) + window / 2) / w
+    scores -= CENTER_BIAS * np.abs(centers - 0.5)[None, :] * 2
+    best = centers[scores.argmax(axis=1)]
+
+    half = fraction / 2
+    track = smooth_track(best, fps, half, 1 - half)
+    times = (np.arange(len(track)) + 0.5) / fps
+    return {"fps": fps, "times": times.tolist(), "centers": track.tolist()}
+
+
+def crop_frame(frame, center, size):
+    """
+    Crops a source frame to the aspect of `size` around `center` (a fraction
+    of the source width) and only then scales it to `size`, so pixels
+    outside the window are never resized. Returns a new, writable array.
+    """
+    out_w, out_h = size
+    src_h, src_w = frame.shape[:2]
+    if src_w * out_h > src_h * out_w:
+        crop_w, crop_h = int(round(src_h * out_w / out_h)), src_h
+    else:
+        crop_w, crop_h = src_w, int(round(src_w * out_h / out_w))
+    y0 = (src_h - crop_h) // 2
+    x0 = int(min(max(0, round(center * src_w - crop_w / 2)), src_w - crop_w))
+    view = frame[y0:y0 + crop_h, x0:x0 + crop_w]
+    if (crop_w, crop_h) == tuple(size):
+        return np.array(view)
+    return np.asarray(Image.fromarray(view).resize(tuple(size), Image.BILINEAR)).copy()
+
+
+class SmartCrop:
+    """
+    One portrait output's frames, cut from the same source-resolution clips
+    the landscape composite is scaled from. Called with a time on the
+    composite, it crops that segment's source frame around its track, so a
+    multi-profile render still decodes each clip once.
+    """
+    def __init__(self, sources, segments, size, proxy_dir=PROXY_DIR):
+        self.sources = sources
+        self.size = (size[0], size[1])
+        self.tracks = [crop_track(seg, self.size, proxy_dir) for seg in segments]
+        self.starts = []
+        t = 0.0
+        for clip in sources:
+            self.starts.append(t)
+            t += clip.duration
+        self.length = t
+
+    def __call__(self, t):
+        # The composite loops footage that is shorter than the audio
+        if self.length and t >= self.length:
+            t %= self.length
+        i = max(0, bisect.bisect_right(self.starts, t) - 1)
+        local = t - self.starts[i]
+        track = self.tracks[i]
+        center = np.interp(local, track["times"], track["centers"])
+        return crop_frame(self.sources[i].get_frame(local), center, self.size)
+
+
+def smart_crops(sources, segments, profiles, proxy_dir=PROXY_DIR):
+    """
+    {profile name: SmartCrop} for the portrait profiles among `profiles`
+    (resolved profile dicts), for render_profiles' `sources`.
+    """
+    return {p["name"]: SmartCrop(sources, segments, (p["width"], p["height"]), proxy_dir)
+            for p in profiles if is_portrait(p)}
+
+
+def share_frames(clip):
+    """
+    Remembers a clip's last frame, so the landscape composite and the smart
+    crops asking for the same time share one decode.
+    """
+    attr = "frame_function" if hasattr(clip, "frame_function") else "make_frame"
+    func = getattr(clip, attr)
+    last = [None, None]
+
+    def frame(t):
+        if last[0] != t:
+            last[1] = func(t)
+            last[0] = t
+        return last[1]
+
+    setattr(clip, attr, frame)
+    return clip
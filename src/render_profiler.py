@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = "outputs/profiles"
+
+PHASES = ["decode", "resize", "composite", "captions", "encode", "other"]
+
+# Histogram bucket edges in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+class StackSampler:
+    """
+    Samples the render thread's Python stack at a fixed interval and counts
+    collapsed stacks, in the "frame;frame;frame count" format read by
+    flamegraph.pl and speedscope.
+    """
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class RenderProfiler:
+    """
+    Opt-in per-frame profiler for create_video.
+
+    Clips are instrumented by wrapping their frame functions: each wrapper records
+    its own (self) time under a phase, excluding time spent in the clips it
+    pulls frames from, so decode, resize, composite and caption costs are
+    separated even though MoviePy nests them. Encode time is measured
+    around the writer.
+    """
+    def __init__(self, name="render", output_dir=PROFILE_DIR, cprofile=False, stacks=False):
+        self.name = name
+        self.output_dir = output_dir
+        self.frames = []
+        self.current = None
+        self._stack = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._sampler = StackSampler(threading.get_ident()) if stacks else None
+        self._started = None
+
+    def instrument(self, clip, phase, label=None, blit=False):
+        """
+        Wraps a clip's frame function (and its mask's) so calls are timed
+        under `phase`. `label` (e.g. "clip 3", "subtitle 7") is recorded for
+        each frame the clip contributes to. With `blit`, pasting the clip onto
+        its parent composite is timed under `phase` too (used for captions,
+        whose cost is mostly the alpha blend).
+
+        The frame function is wrapped rather than get_frame because MoviePy
+        copies clips when deriving new ones; derived clips get their own
+        frame function, so the wrapper stays with the clip it was put on.
+        """
+        attr = "frame_function" if hasattr(clip, "frame_function") else "make_frame"
+        setattr(clip, attr, self._timed(getattr(clip, attr), phase, label))
+        if blit:
+            # MoviePy 2 pastes with compose_on, 1.x with blit_on
+            attr = "compose_on" if hasattr(clip, "compose_on") else "blit_on"
+            setattr(clip, attr, self._timed(getattr(clip, attr), phase, label))
+        if getattr(clip, "mask", None) is not None and clip.mask is not clip:
+            self.instrument(clip.mask, phase, label)
+        return clip
+
+    def _timed(self, func, phase, label):
+        """
+        Wraps `func` to record its self time: its duration minus the time of
+        any timed calls nested inside it.
+        """
+        profiler = self
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            profiler._stack.append(0.0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child = profiler._stack.pop()
+                profiler._add(phase, elapsed - child, label)
+                if profiler._stack:
+                    profiler._stack[-1] += elapsed
+
+        return timed
+
+    def _add(self, phase, seconds, label=None):
+        if self.current is None:
+            return
+        phases = self.current["phases"]
+        phases[phase] = phases.get(phase, 0.0) + seconds
+        if label is not None:
+            labels = self.current["labels"]
+            labels[label] = labels.get(label, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name, label=None):
+        """
+        Times a block under `name`, excluding timed clip calls inside it
+        (e.g. a smart crop decoding its source frame).
+        """
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            child = self._stack.pop()
+            self._add(name, elapsed - child, label)
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self._cprofile:
+            self._cprofile.enable()
+        if self._sampler:
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler:
+            self._sampler.stop()
+        if self._cprofile:
+            self._cprofile.disable()
+        self.wall_time = time.perf_counter() - self._started
+
+    def begin_frame(self, index, t):
+        self.current = {"index": index, "t": t, "phases": {}, "labels": {}, "start": time.perf_counter()}
+
+    def end_frame(self):
+        frame = self.current
+        frame["total"] = time.perf_counter() - frame.pop("start")
+        accounted = sum(frame["phases"].values())
+        frame["phases"]["other"] = max(0.0, frame["total"] - accounted)
+        self.frames.append(frame)
+        self.current = None
+
+    def phase_stats(self):
+        stats = {}
+        for phase in PHASES:
+            values = sorted(f["phases"].get(phase, 0.0) * 1000 for f in self.frames)
+            if not values or not any(values):
+                continue
+            counts = [0] * (len(BUCKETS_MS) + 1)
+            for v in values:
+                counts[sum(1 for edge in BUCKETS_MS if v >= edge)] += 1
+            stats[phase] = {
+                "total_s": sum(values) / 1000,
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1],
+                "histogram": counts
+            }
+        return stats
+
+    def slowest_segments(self, fps, seconds=1.0, top=5):
+        """
+        Groups frames into `seconds`-long windows and returns the slowest,
+        with the clips and subtitles that cost the most in each.
+        """
+        windows = {}
+        per_window = max(1, int(round(fps * seconds)))
+        for frame in self.frames:
+            window = windows.setdefault(frame["index"] // per_window, {"total": 0.0, "phases": Counter(), "labels": Counter()})
+            window["total"] += frame["total"]
+            window["phases"].update(frame["phases"])
+            window["labels"].update(frame["labels"])
+
+        ranked = sorted(windows.items(), key=lambda item: item[1]["total"], reverse=True)[:top]
+        result = []
+        for index, window in ranked:
+            result.append({
+                "start": index * per_window / fps,
+                "end": (index + 1) * per_window / fps,
+                "total_ms": window["total"] * 1000,
+                "phases_ms": {k: v * 1000 for k, v in window["phases"].most_common()},
+                "sources_ms": {k: v * 1000 for k, v in window["labels"].most_common(3)}
+            })
+        return result
+
+    def report(self, fps):
+        stats = self.phase_stats()
+        labels = [f"<{BUCKETS_MS[0]}"] + [f"{a}-{b}" for a, b in zip(BUCKETS_MS, BUCKETS_MS[1:])] + [f">={BUCKETS_MS[-1]}"]
+        lines = [f"Render profile: {len(self.frames)} frames in {getattr(self, 'wall_time', 0):.1f}s",
+                 f"{'phase':<10}{'total s':>9}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+        for phase, s in stats.items():
+            lines.append(f"{phase:<10}{s['total_s']:>9.2f}{s['mean_ms']:>9.1f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['max_ms']:>9.1f}")
+        lines.append("Frames per time bucket (ms):")
+        for phase, s in stats.items():
+            hist = "  ".join(f"{label}:{count}" for label, count in zip(labels, s["histogram"]) if count)
+            lines.append(f"  {phase:<10}{hist}")
+        lines.append("Slowest segments:")
+        for seg in self.slowest_segments(fps):
+            top_phase = next(iter(seg["phases_ms"]), "-")
+            sources = ", ".join(f"{k} {v:.0f}ms" for k, v in seg["sources_ms"].items()) or "-"
+            lines.append(f"  {seg['start']:6.1f}-{seg['end']:6.1f}s  {seg['total_ms']:8.0f}ms  mostly {top_phase}; {sources}")
+        return "\n".join(lines)
+
+    def save(self, fps):
+        """
+        Writes the JSON report (and .prof / .folded files if enabled).
+        Returns {kind: path}.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.join(self.output_dir, f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        paths = {"report": stem + ".json"}
+        with open(paths["report"], "w") as f:
+            json.dump({
+                "name": self.name,
+                "frames": len(self.frames),
+                "wall_time": getattr(self, "wall_time", None),
+                "phases": self.phase_stats(),
+                "slowest_segments": self.slowest_segments(fps),
+                "per_frame": [{"t": fr["t"], "total": fr["total"], "phases": fr["phases"]} for fr in self.frames]
+            }, f, indent=2)
+        if self._cprofile:
+            paths["cprofile"] = stem + ".prof"
+            self._cprofile.dump_stats(paths["cprofile"])
+        if self._sampler:
+            paths["stacks"] = self._sampler.write(stem + ".folded")
+        return paths
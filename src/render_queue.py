@@ -0,0 +1,212 @@
+import json
+import os
+import sys
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from src.scheduler import add_to_queue
+from src.file_lock import file_lock, write_json
+
+RENDER_QUEUE_FILE = "outputs/render_queue.json"
+SCRATCH_DIR = "outputs/scratch"
+TMPFS_DIR = "/dev/shm"
+
+# x264 threads per render. Each render also keeps roughly one core busy
+# compositing frames in Python, so a job occupies X264_THREADS + 1 cores.
+X264_THREADS = 2
+
+def get_render_queue():
+    if not os.path.exists(RENDER_QUEUE_FILE):
+        return []
+    with open(RENDER_QUEUE_FILE, "r") as f:
+        try:
+            return json.load(f)
+        except:
+            return []
+
+def save_render_queue(queue):
+    write_json(RENDER_QUEUE_FILE, queue)
+
+def render_queue_lock():
+    return file_lock(RENDER_QUEUE_FILE)
+
+def add_render_job(audio_path, video_path, title, description, keywords=None, script_text=None, source="stock",
+                   profiles=None, music_path=None, schedule_time=None, channel=None):
+    """
+    Queues a render. When it finishes, the video is queued for upload at
+    `schedule_time` (datetime or ISO string; defaults to as soon as possible).
+    The job ID is added to `video_path`'s file name, so jobs for the same
+    topic (or an interactive render) never write the same file.
+    Returns the job ID.
+    """
+    if isinstance(schedule_time, datetime):
+        schedule_time = schedule_time.isoformat()
+
+    job_id = str(uuid.uuid4())
+    stem, ext = os.path.splitext(video_path)
+    job = {
+        "id": job_id,
+        "params": {
+            "audio_path": audio_path,
+            "video_save_path": f"{stem}_{job_id[:8]}{ext or '.mp4'}",
+            "keywords": keywords,
+            "script_text": script_text,
+            "source": source,
+            "profiles": profiles,
+            "music_path": music_path
+        },
+        "title": title,
+        "description": description,
+        "schedule_time": schedule_time,
+        "channel": channel,
+        "status": "queued",
+        "created_at": datetime.now().isoformat()
+    }
+    with render_queue_lock():
+        queue = get_render_queue()
+        queue.append(job)
+        save_render_queue(queue)
+    return job_id
+
+def update_render_job(job_id, updates):
+    """
+    Updates one job in the file as it is now, leaving jobs added or removed
+    since it was read untouched.
+    """
+    with render_queue_lock():
+        queue = get_render_queue()
+        for job in queue:
+            if job["id"] == job_id:
+                job.update(updates)
+                save_render_queue(queue)
+                return True
+    return False
+
+def delete_render_job(job_id):
+    with render_queue_lock():
+        queue = get_render_queue()
+        new_queue = [job for job in queue if job["id"] != job_id or job["status"] == "rendering"]
+        if len(new_queue) < len(queue):
+            save_render_queue(new_queue)
+            return True
+    return False
+
+def plan_workers(threads_per_job=X264_THREADS, cores=None):
+    """
+    Sizes the worker pool so renders don't oversubscribe the machine.
+    Returns (workers, threads_per_job).
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, cores // (threads_per_job + 1))
+    return workers, threads_per_job
+
+def make_scratch_dir(job_id, use_tmpfs=False):
+    """
+    Creates a private scratch directory for one render, on tmpfs if asked
+    and available.
+    """
+    root = TMPFS_DIR if use_tmpfs and os.path.isdir(TMPFS_DIR) else SCRATCH_DIR
+    os.makedirs(root, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"render_{job_id[:8]}_", dir=root)
+
+def run_render_job(job, threads=X264_THREADS, use_tmpfs=False):
+    """
+    Renders one job in its own scratch directory. Runs in a worker process.
+    Returns (job_id, result, error).
+    """
+    # Imported in the worker so the parent process stays light
+    from src.video_gen import create_video
+
+    scratch = make_scratch_dir(job["id"], use_tmpfs)
+    try:
+        result = create_video(scratch_dir=scratch, threads=threads, **job["params"])
+        return job["id"], result, None
+    except Exception as e:
+        return job["id"], None, str(e)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def upload_path(result):
+    """
+    Picks the file to upload from a render result (path or {profile: path}).
+    """
+    if isinstance(result, dict):
+        return next((path for name, path in result.items() if name != "preview"), next(iter(result.values())))
+    return result
+
+def process_alive(pid):
+    """
+    True if `pid` may still be running. Windows has no safe probe, so a
+    job claimed there counts as running until recovered explicitly.
+    """
+    if not pid:
+        return False
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def is_stale(job, recover=False):
+    """
+    True for a job left 'rendering' by a run that is gone: its process has
+    exited, or `recover` is set (e.g. after a reboot, when PIDs are reused).
+    """
+    return job["status"] == "rendering" and (recover or not process_alive(job.get("pid")))
+
+def process_render_queue(workers=None, threads_per_job=X264_THREADS, use_tmpfs=False, recover=False):
+    """
+    Renders every queued job on a process pool sized to the machine and
+    queues each finished video for upload.
+    Jobs are claimed under the queue lock with this process's PID, so runs
+    started from the app and the command line never render a job twice.
+    Jobs left 'rendering' by a run that died are picked up again (see
+    is_stale).
+    """
+    planned_workers, threads = plan_workers(threads_per_job)
+    workers = workers or planned_workers
+
+    with render_queue_lock():
+        queue = get_render_queue()
+        pending = [job for job in queue if job["status"] == "queued" or is_stale(job, recover)]
+        if not pending:
+            return 0
+        for job in pending:
+            job["status"] = "rendering"
+            job["pid"] = os.getpid()
+            job["started_at"] = datetime.now().isoformat()
+        save_render_queue(queue)
+    print(f"Rendering {len(pending)} jobs on {workers} workers ({threads} x264 threads each)")
+
+    jobs_by_id = {job["id"]: job for job in pending}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_render_job, job, threads, use_tmpfs): job["id"] for job in pending}
+        for future in as_completed(futures):
+            job = jobs_by_id[futures[future]]
+            try:
+                _, result, error = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result, error = None, str(e)
+            # Jobs added while rendering are picked up by the next run;
+            # only this job's entry is rewritten
+            updates = {"finished_at": datetime.now().isoformat()}
+            if error:
+                print(f"Error rendering {job['title']}: {error}")
+                updates.update(status="failed", error=error)
+            else:
+                updates.update(status="rendered", result=result)
+                add_to_queue(upload_path(result), job["title"], job["description"],
+                             job["schedule_time"] or datetime.now(), channel=job.get("channel"))
+            update_render_job(job["id"], updates)
+    return len(pending)
+
+if __name__ == "__main__":
+    # Usage: python -m src.render_queue [--tmpfs] [--recover]
+    process_render_queue(use_tmpfs="--tmpfs" in sys.argv, recover="--recover" in sys.argv)
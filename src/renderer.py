@@ -0,0 +1,234 @@
+import os
+import numpy as np
+from PIL import Image, ImageDraw
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from src.fonts import get_font, wrap_text
+from src.ffmpeg_utils import mux_audio
+
+# Output profiles. Captions are laid out per profile: font size, the
+# fraction of the frame width text may span, and the vertical position of
+# the caption block's top edge.
+OUTPUT_PROFILES = {
+    "short": {
+        "width": 1080, "height": 1920, "bitrate": "8000k",
+        "caption": {"font_size": 70, "max_width": 0.85, "y": 0.70}
+    },
+    "landscape": {
+        "width": 1920, "height": 1080, "bitrate": "6000k",
+        "caption": {"font_size": 50, "max_width": 0.8, "y": 0.8}
+    },
+    "preview": {
+        "width": 640, "height": 360, "bitrate": "800k",
+        "caption": {"font_size": 20, "max_width": 0.8, "y": 0.8}
+    },
+}
+
+
+def resolve_profile(profile):
+    """
+    Accepts a profile name or dict (optionally with a "base" preset name)
+    and returns a complete profile dict with a "name".
+    """
+    if isinstance(profile, str):
+        if profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile: {profile}")
+        return dict(OUTPUT_PROFILES[profile], name=profile)
+
+    base = OUTPUT_PROFILES.get(profile.get("base") or profile.get("name"), {})
+    resolved = dict(base)
+    resolved.update(profile)
+    resolved["caption"] = dict(base.get("caption", {}), **profile.get("caption", {}))
+    resolved.setdefault("name", profile.get("base") or f"{resolved['width']}x{resolved['height']}")
+    return resolved
+
+
+def crop_box(src_w, src_h, dst_w, dst_h):
+    """
+    Largest centered window of the source with the destination's aspect.
+    Returns (x0, y0, width, height).
+    """
+    target = dst_w / dst_h
+    if src_w / src_h > target:
+        w, h = int(round(src_h * target)), src_h
+    else:
+        w, h = src_w, int(round(src_w / target))
+    return (src_w - w) // 2, (src_h - h) // 2, w, h
+
+
+def render_caption_rgba(text, profile):
+    """
+    Renders a caption for a profile's layout as an RGBA array plus its
+    top-left position in the output frame.
+    """
+    layout = profile["caption"]
+    width, height = profile["width"], profile["height"]
+    font = get_font(layout["font_size"])
+    stroke = max(1, layout["font_size"] // 25)
+    lines = wrap_text(text, font, width * layout["max_width"])
+
+    line_height = int(layout["font_size"] * 1.2)
+    box_w = int(max(font.getlength(line) for line in lines)) + 2 * stroke + 2
+    box_h = line_height * len(lines) + 2 * stroke
+    image = Image.new("RGBA", (box_w, box_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        x = (box_w - font.getlength(line)) / 2
+        draw.text((x, stroke + i * line_height), line, font=font, fill=(255, 255, 255, 255),
+                  stroke_width=stroke, stroke_fill=(0, 0, 0, 255))
+
+    x0 = max(0, (width - box_w) // 2)
+    y0 = min(int(height * layout["y"]), height - box_h)
+    return np.asarray(image), (x0, max(0, y0))
+
+
+def overlay_rgba(frame, rgba, position):
+    """
+    Alpha-blends an RGBA overlay onto an RGB frame in place, touching only
+    the overlay's rectangle.
+    """
+    x0, y0 = position
+    h = min(rgba.shape[0], frame.shape[0] - y0)
+    w = min(rgba.shape[1], frame.shape[1] - x0)
+    if h <= 0 or w <= 0:
+        return frame
+    region = frame[y0:y0 + h, x0:x0 + w].astype(np.uint16)
+    rgb = rgba[:h, :w, :3].astype(np.uint16)
+    alpha = rgba[:h, :w, 3:4].astype(np.uint16)
+    frame[y0:y0 + h, x0:x0 + w] = ((rgb * alpha + region * (255 - alpha) + 127) // 255).astype(np.uint8)
+    return frame
+
+
+class CaptionTrack:
+    """
+    Pre-rendered captions for one profile, looked up by time. Frames are
+    requested in order, so lookups walk a cursor instead of searching.
+    """
+    def __init__(self, captions, profile):
+        self.items = []
+        for index, caption in sorted(enumerate(captions), key=lambda item: item[1]["start"]):
+            rgba, position = render_caption_rgba(caption["text"], profile)
+            self.items.append((caption["start"], caption["start"] + caption["duration"], rgba, position, index))
+        self.cursor = 0
+
+    def at(self, t):
+        while self.cursor < len(self.items) and self.items[self.cursor][1] <= t:
+            self.cursor += 1
+        if self.cursor < len(self.items) and self.items[self.cursor][0] <= t:
+            return self.items[self.cursor]
+        return None
+
+
+class ProfileOutput:
+    """
+    One output of a multi-profile render: reframes each master frame for the
+    profile, burns in its captions and feeds its own encoder.
+    """
+    def __init__(self, profile, path, master_size, captions, fps, audio_path=None, codec="libx264", threads=None,
+                 source=None):
+        self.profile = profile
+        # Optional callable giving this output's frame for a clip time
+        # directly (e.g. a smart crop of the source), instead of a center
+        # crop of the master frame
+        self.source = source
+        self.path = path
+        self.audio_path = audio_path
+        # With audio, frames go to a silent file that is muxed on close
+        self.video_path = f"{os.path.splitext(path)[0]}.video.mp4" if audio_path else path
+        self.size = (profile["width"], profile["height"])
+        self.box = crop_box(master_size[0], master_size[1], *self.size)
+        self.captions = CaptionTrack(captions, profile)
+        self.writer = FFMPEG_VideoWriter(self.video_path, self.size, fps, codec=codec, bitrate=profile.get("bitrate"),
+                                         threads=threads)
+
+    def reframe(self, frame, clip_t=None):
+        if self.source is not None:
+            return self.source(clip_t)
+        x0, y0, w, h = self.box
+        view = frame[y0:y0 + h, x0:x0 + w]
+        if (w, h) == self.size:
+            return np.array(view)
+        return np.asarray(Image.fromarray(view).resize(self.size, Image.BILINEAR)).copy()
+
+    def write(self, frame, t, profiler=None, clip_t=None):
+        if profiler is None:
+            out = self.reframe(frame, clip_t)
+            caption = self.captions.at(t)
+            if caption:
+                overlay_rgba(out, caption[2], caption[3])
+            self.writer.write_frame(out)
+            return
+
+        name = self.profile["name"]
+        with profiler.phase("resize", name):
+            out = self.reframe(frame, clip_t)
+        caption = self.captions.at(t)
+        if caption:
+            with profiler.phase("captions", f"{name} subtitle {caption[4]}"):
+                overlay_rgba(out, caption[2], caption[3])
+        with profiler.phase("encode", name):
+            self.writer.write_frame(out)
+
+    def close(self, mux=True):
+        self.writer.close()
+        if self.audio_path and mux:
+            mux_audio(self.video_path, self.audio_path, self.path)
+            os.remove(self.video_path)
+
+
+def render_profiles(base_clip, captions, outputs, fps=24, audio_path=None, threads=None, profiler=None,
+                    frames=None, clip_start=0.0, sources=None):
+    """
+    Renders several output profiles from a single decode and composition
+    pass over `base_clip` (footage without captions).
+
+    `outputs` is a list of (profile, path) pairs. Returns {profile name: path}.
+    With a RenderProfiler, every frame's phases are timed.
+
+    To render part of a longer timeline, pass `frames` (a range of frame
+    indices on the timeline) and `clip_start`, the timeline time at which
+    `base_clip` starts. Caption times are always timeline times.
+
+    `sources` maps profile names to callables that produce that profile's
+    frame for a time on `base_clip` (see src.reframe.SmartCrop); they are
+    called right after the master frame, so they can share its decode. If
+    every output has a source, the master frame is not rendered at all.
+    """
+    sources = sources or {}
+    profiles = [(resolve_profile(profile), path) for profile, path in outputs]
+    writers = [ProfileOutput(profile, path, base_clip.size, captions, fps, audio_path=audio_path, threads=threads,
+                             source=sources.get(profile["name"]))
+               for profile, path in profiles]
+    completed = False
+    try:
+        if frames is None:
+            frames = range(int(round(base_clip.duration * fps)))
+        # When every output cuts its own frames from the source (e.g. a
+        # Shorts-only smart-crop render), the master is never composited
+        need_master = any(writer.source is None for writer in writers)
+        frame = None
+        if profiler:
+            profiler.start()
+        for i in frames:
+            t = i / fps
+            if profiler:
+                profiler.begin_frame(i, t)
+            if need_master:
+                frame = base_clip.get_frame(t - clip_start)
+                if frame.dtype != np.uint8:
+                    frame = frame.astype(np.uint8)
+            for writer in writers:
+                writer.write(frame, t, profiler, t - clip_start)
+            if profiler:
+                profiler.end_frame()
+        completed = True
+    finally:
+        if profiler:
+            profiler.stop()
+        for writer in writers:
+            writer.close(mux=completed)
+    return {writer.profile["name"]: writer.path for writer in writers}
+
+
+def profile_output_path(video_save_path, profile):
+    stem, ext = os.path.splitext(video_save_path)
+    return profile.get("path") or f"{stem}_{profile['name']}{ext or '.mp4'}"
@@ -3,9 +3,13 @@ import os
 import time
 import uuid
 from datetime import datetime
-from src.uploader import get_authenticated_service, upload_video
+from src.uploader import get_authenticated_service, upload_video, get_channel, load_channels, is_quota_error
+from src.quota import QuotaLedger, next_reset, UNIT_COSTS
+from src.topic_history import record_topic
+from src.file_lock import file_lock, write_json
 
 QUEUE_FILE = "outputs/queue.json"
+UPLOAD_COST = UNIT_COSTS["videos.insert"]
 
 def get_queue():
     if not os.path.exists(QUEUE_FILE):
@@ -17,78 +21,194 @@ def get_queue():
             return []
 
 def save_queue(queue):
-    with open(QUEUE_FILE, "w") as f:
-        json.dump(queue, f, indent=4)
+    write_json(QUEUE_FILE, queue)
 
-def add_to_queue(video_path, title, description, schedule_time):
+def queue_lock():
+    return file_lock(QUEUE_FILE)
+
+def add_to_queue(video_path, title, description, schedule_time, channel=None):
     """
     schedule_time should be a datetime object or ISO string.
+    channel is a name from channels.json (defaults to the first channel).
     """
     if isinstance(schedule_time, datetime):
         schedule_time = schedule_time.isoformat()
     
-    queue = get_queue()
-    queue.append({
+    item = {
         "id": str(uuid.uuid4()),
         "video_path": video_path,
         "title": title,
         "description": description,
         "schedule_time": schedule_time,
+        "channel": channel or get_channel()[0],
         "status": "queued",
         "created_at": datetime.now().isoformat()
-    })
-    save_queue(queue)
+    }
+    with queue_lock():
+        queue = get_queue()
+        queue.append(item)
+        save_queue(queue)
+    record_topic(title, "queued")
 
 def update_queue_item(item_id, updates):
     """
-    Updates a queue item by its ID.
+    Updates a queue item by its ID, in the file as it is now, so items
+    added meanwhile (e.g. by a render process) are kept.
     """
-    queue = get_queue()
-    for item in queue:
-        if item["id"] == item_id:
-            item.update(updates)
-            save_queue(queue)
-            return True
+    with queue_lock():
+        queue = get_queue()
+        for item in queue:
+            if item["id"] == item_id:
+                item.update(updates)
+                save_queue(queue)
+                return True
     return False
 
 def delete_from_queue(item_id):
     """
     Deletes an item from the queue by ID.
     """
-    queue = get_queue()
-    new_queue = [item for item in queue if item["id"] != item_id]
-    if len(new_queue) < len(queue):
-        save_queue(new_queue)
-        return True
+    with queue_lock():
+        queue = get_queue()
+        new_queue = [item for item in queue if item["id"] != item_id]
+        if len(new_queue) < len(queue):
+            save_queue(new_queue)
+            return True
     return False
 
+def get_due_items(queue, now=None):
+    """
+    Returns queued items whose schedule time has passed and that aren't
+    deferred to a later quota window, earliest first.
+    """
+    now = now or datetime.now()
+    due = []
+    for item in queue:
+        if item["status"] != "queued":
+            continue
+        if now < datetime.fromisoformat(item["schedule_time"]):
+            continue
+        if item.get("deferred_until") and now < datetime.fromisoformat(item["deferred_until"]):
+            continue
+        due.append(item)
+    return sorted(due, key=lambda item: item["schedule_time"])
+
+def plan_uploads(due, ledger, now=None):
+    """
+    Packs due uploads into the quota left in each channel's pool.
+    Returns (to_upload, deferred).
+    """
+    budget = {}
+    to_upload, deferred = [], []
+    for item in due:
+        try:
+            channel, config = get_channel(item.get("channel"))
+        except ValueError as e:
+            item["status"] = "failed"
+            item["error"] = str(e)
+            update_queue_item(item["id"], {"status": "failed", "error": item["error"]})
+            continue
+        pool = config["quota_pool"]
+        if pool not in budget:
+            budget[pool] = ledger.remaining(pool, config.get("daily_quota"), now)
+        if budget[pool] >= UPLOAD_COST:
+            budget[pool] -= UPLOAD_COST
+            to_upload.append(item)
+        else:
+            deferred.append(item)
+    return to_upload, deferred
+
+def defer_item(item, now=None):
+    item["deferred_until"] = next_reset(now).isoformat()
+    update_queue_item(item["id"], {"deferred_until": item["deferred_until"]})
+    print(f"Deferring '{item['title']}' to the next quota window ({item['deferred_until']}).")
+
 def process_queue():
     """
     Checks the queue and uploads videos that are past their schedule time.
+    Uploads are packed into each channel's remaining daily quota; whatever
+    doesn't fit stays queued until the next quota reset instead of failing.
+    Each result is written to the queue file as it happens, so items added
+    during the run are kept.
     """
     queue = get_queue()
     now = datetime.now()
-    updated = False
-    
-    for item in queue:
-        if item["status"] == "queued":
-            sched_time = datetime.fromisoformat(item["schedule_time"])
-            if now >= sched_time:
-                print(f"Uploading scheduled video: {item['title']}")
-                try:
-                    youtube = get_authenticated_service()
-                    upload_video(youtube, item["video_path"], item["title"], item["description"])
-                    item["status"] = "uploaded"
-                    item["uploaded_at"] = datetime.now().isoformat()
-                    updated = True
-                except Exception as e:
-                    print(f"Error uploading {item['title']}: {e}")
-                    item["status"] = "failed"
-                    item["error"] = str(e)
-                    updated = True
-    
-    if updated:
-        save_queue(queue)
+    ledger = QuotaLedger()
+    due = get_due_items(queue, now)
+    to_upload, deferred = plan_uploads(due, ledger, now)
+    exhausted = set()
+    services = {}
+
+    for item in deferred:
+        defer_item(item, now)
+
+    for item in to_upload:
+        channel, config = get_channel(item.get("channel"))
+        pool = config["quota_pool"]
+        if pool in exhausted:
+            defer_item(item, now)
+            continue
+
+        print(f"Uploading scheduled video: {item['title']} ({channel})")
+        try:
+            if channel not in services:
+                services[channel] = get_authenticated_service(channel)
+            response = upload_video(services[channel], item["video_path"], item["title"], item["description"])
+            ledger.spend(pool, "videos.insert", config.get("daily_quota"))
+            update_queue_item(item["id"], {
+                "status": "uploaded",
+                "uploaded_at": datetime.now().isoformat(),
+                "video_id": response.get("id"),
+                "deferred_until": None
+            })
+            record_topic(item["title"], "uploaded")
+        except Exception as e:
+            if is_quota_error(e):
+                print(f"Quota exhausted for {pool}: {e}")
+                ledger.exhaust(pool)
+                exhausted.add(pool)
+                defer_item(item, now)
+            else:
+                print(f"Error uploading {item['title']}: {e}")
+                update_queue_item(item["id"], {"status": "failed", "error": str(e)})
+
+def upload_now(video_path, title, description, channel=None):
+    """
+    Uploads a video right away, outside the queue, on the same channel and
+    quota ledger the queue uses. Raises if the channel's pool has no room
+    left for an upload today. Returns the API response.
+    """
+    channel, config = get_channel(channel)
+    pool = config["quota_pool"]
+    ledger = QuotaLedger()
+    if ledger.remaining(pool, config.get("daily_quota")) < UPLOAD_COST:
+        raise RuntimeError(f"Not enough quota left on {pool} for an upload; resets at {next_reset().isoformat(timespec='minutes')}")
+
+    try:
+        response = upload_video(get_authenticated_service(channel), video_path, title, description)
+    except Exception as e:
+        if is_quota_error(e):
+            ledger.exhaust(pool)
+        raise
+    ledger.spend(pool, "videos.insert", config.get("daily_quota"))
+    return response
+
+def get_quota_status():
+    """
+    Remaining quota per channel, for display.
+    """
+    ledger = QuotaLedger()
+    rows = []
+    for channel, config in load_channels().items():
+        remaining = ledger.remaining(config["quota_pool"], config.get("daily_quota"))
+        rows.append({
+            "channel": channel,
+            "pool": config["quota_pool"],
+            "remaining": remaining,
+            "uploads_left": remaining // UPLOAD_COST,
+            "resets_at": next_reset().isoformat(timespec="minutes")
+        })
+    return rows
 
 if __name__ == "__main__":
     # Test
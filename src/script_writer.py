@@ -1,13 +1,11 @@
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
+from src.topic_history import record_topic
 
 load_dotenv()
 
-def generate_script(topic, api_key=None):
-    """
-    Generates a 60-second YouTube script for a specific topic.
-    """
+def get_model(api_key=None):
     if api_key:
         genai.configure(api_key=api_key)
     elif os.getenv("GEMINI_API_KEY"):
@@ -15,9 +13,10 @@ def generate_script(topic, api_key=None):
     else:
         raise ValueError("Gemini API Key not found.")
 
-    model = genai.GenerativeModel('gemini-3-flash-preview')
-    
-    prompt = f"""
+    return genai.GenerativeModel('gemini-3-flash-preview')
+
+def script_prompt(topic):
+    return f"""
     Write a 60-second faceless YouTube script on "{topic}". 
     Include:
     1. A hook (first 3 seconds)
@@ -29,9 +28,28 @@ def generate_script(topic, api_key=None):
     Language: English.
     Return only the script text.
     """
-    
-    response = model.generate_content(prompt)
-    return response.text.strip()
+
+def generate_script(topic, api_key=None):
+    """
+    Generates a 60-second YouTube script for a specific topic.
+    """
+    model = get_model(api_key)
+    response = model.generate_content(script_prompt(topic))
+    script = response.text.strip()
+    record_topic(topic, "scripted")
+    return script
+
+def stream_script(topic, api_key=None):
+    """
+    Same as generate_script, but yields the script in chunks as Gemini
+    writes it, so later stages can start before it is finished.
+    """
+    model = get_model(api_key)
+    response = model.generate_content(script_prompt(topic), stream=True)
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+    record_topic(topic, "scripted")
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,178 @@
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from src.ffmpeg_utils import concat_videos
+from src.renderer import resolve_profile, render_profiles, profile_output_path
+from src.reframe import smart_crops
+from src.render_queue import plan_workers, X264_THREADS
+
+# Segments per worker. A few more segments than workers evens out clips
+# that are slower to decode than others.
+SEGMENTS_PER_WORKER = 2
+
+
+def clip_boundaries(segments, fps):
+    """
+    Timeline start time of every footage segment, and the first frame index
+    at or after it. Frames before a segment's first frame never show it.
+    Returns a list of (time, frame).
+    """
+    boundaries = []
+    t = 0.0
+    for seg in segments:
+        boundaries.append((t, math.ceil(t * fps - 1e-6)))
+        t += seg["duration"]
+    return boundaries
+
+
+def plan_chunks(segments, duration, fps, count):
+    """
+    Splits the timeline into at most `count` chunks of roughly equal frame
+    counts, cutting only at footage segment boundaries.
+    Returns a list of {"first", "last", "start", "frames"}: the segment index
+    range [first, last), the timeline time of the first segment and the
+    range of frame indices to render.
+    """
+    n_frames = int(round(duration * fps))
+    boundaries = clip_boundaries(segments, fps)
+    cuts = [0]
+    for k in range(1, count):
+        target = k * n_frames / count
+        candidates = [i for i, (_, frame) in enumerate(boundaries) if i > cuts[-1] and frame < n_frames]
+        if not candidates:
+            break
+        cuts.append(min(candidates, key=lambda i: abs(boundaries[i][1] - target)))
+    cuts.append(len(segments))
+
+    chunks = []
+    for first, last in zip(cuts, cuts[1:]):
+        end_frame = boundaries[last][1] if last < len(segments) else n_frames
+        chunks.append({
+            "first": first,
+            "last": last,
+            "start": boundaries[first][0],
+            "frames": range(boundaries[first][1], min(end_frame, n_frames))
+        })
+    return [chunk for chunk in chunks if len(chunk["frames"])]
+
+
+def footage_size(segments):
+    """
+    Frame size of the full concatenated timeline: the largest clip once
+    scaled, as concatenate_videoclips would compute it.
+    """
+    from src.video_gen import load_footage
+
+    clips = load_footage(segments)
+    try:
+        return max(c.w for c in clips), max(c.h for c in clips)
+    finally:
+        for clip in clips:
+            clip.close()
+
+
+def local_captions(captions, start, end):
+    """
+    Captions overlapping [start, end) on the timeline, cut to that window
+    and shifted so `start` is 0.
+    """
+    result = []
+    for caption in captions:
+        c_start = max(caption["start"], start)
+        c_end = min(caption["start"] + caption["duration"], end)
+        if c_end > c_start:
+            result.append(dict(caption, start=c_start - start, duration=c_end - c_start))
+    return result
+
+
+def render_chunk(task):
+    """
+    Renders one chunk of the timeline to silent video files, one per
+    output. Runs in a worker process.
+    """
+    # Imported in the worker so the parent process stays light
+    from src.video_gen import load_footage, compose_video
+
+    sources = [] if task["smart_crop"] else None
+    clips = load_footage(task["segments"], sources=sources)
+    try:
+        length = sum(seg["duration"] for seg in task["segments"])
+        base = compose_video(clips, task["overlay_captions"], length, size=task["size"])
+        crops = None
+        if task["smart_crop"]:
+            crops = smart_crops(sources, task["segments"], [profile for profile, _ in task["outputs"]],
+                                task["proxy_dir"])
+        return render_profiles(base, task["captions"], task["outputs"], fps=task["fps"], threads=task["threads"],
+                               frames=task["frames"], clip_start=task["start"], sources=crops)
+    finally:
+        for clip in clips:
+            clip.close()
+
+
+def render_segmented(segments, captions, duration, video_save_path, audio_path, profiles=None, workers=None,
+                     fps=24, threads=None, scratch_dir="outputs/videos", smart_crop=False):
+    """
+    Renders a stock-footage timeline in parallel: the timeline is cut at
+    footage boundaries into chunks, each chunk (footage and captions) is
+    rendered and encoded in its own process, and the encoded chunks are
+    joined with a stream copy and muxed with the continuous audio track.
+
+    Every chunk starts with a fresh encoder, so each join lands on a
+    keyframe, and chunks cover consecutive frame ranges of the same
+    timeline, so timing and sync match a single-pass render.
+
+    With `profiles`, returns {profile name: path} like render_profiles;
+    otherwise renders one output at the footage's size to
+    `video_save_path` and returns that path. `smart_crop` reframes portrait
+    profiles around the action (src.reframe) in the same pass.
+    """
+    # Segment processes are sized like render queue jobs
+    planned_workers, threads = plan_workers(threads or X264_THREADS)
+    workers = workers or planned_workers
+    size = footage_size(segments)
+    chunks = plan_chunks(segments, duration, fps, workers * SEGMENTS_PER_WORKER)
+
+    if profiles:
+        # Captions are burned in per profile, so the composite is footage only
+        outputs = [(p, profile_output_path(video_save_path, p)) for p in (resolve_profile(p) for p in profiles)]
+        profile_captions, overlay_captions = captions, []
+    else:
+        outputs = [({"name": "main", "width": size[0], "height": size[1]}, video_save_path)]
+        profile_captions, overlay_captions = [], captions
+
+    os.makedirs(scratch_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=scratch_dir)
+    try:
+        tasks = []
+        for k, chunk in enumerate(chunks):
+            end = sum(seg["duration"] for seg in segments[:chunk["last"]])
+            tasks.append({
+                "segments": segments[chunk["first"]:chunk["last"]],
+                "start": chunk["start"],
+                "frames": chunk["frames"],
+                "size": size,
+                "smart_crop": bool(smart_crop and profiles),
+                "proxy_dir": work_dir,
+                "captions": [c for c in profile_captions
+                             if c["start"] < end and c["start"] + c["duration"] > chunk["start"]],
+                "overlay_captions": local_captions(overlay_captions, chunk["start"], end),
+                "outputs": [(profile, os.path.join(work_dir, f"{k:03d}_{profile['name']}.mp4"))
+                            for profile, _ in outputs],
+                "fps": fps,
+                "threads": threads
+            })
+        print(f"Rendering {len(tasks)} segments on {min(workers, len(tasks))} workers ({threads} x264 threads each)")
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            parts = list(pool.map(render_chunk, tasks))
+
+        result = {}
+        for profile, path in outputs:
+            concat_videos([part[profile["name"]] for part in parts], path, audio_path=audio_path)
+            result[profile["name"]] = path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return result if profiles else video_save_path
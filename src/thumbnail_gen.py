@@ -1,42 +1,206 @@
 import os
-from PIL import Image, ImageDraw, ImageFont
+import subprocess
+from io import BytesIO
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw, ImageEnhance
 from dotenv import load_dotenv
+from src.fonts import get_font, wrap_text
+from src.ffmpeg_utils import get_ffmpeg_exe
 
 load_dotenv()
 
-def generate_thumbnail(text, output_path, bg_color=(0, 0, 0)):
+THUMB_SIZE = (1280, 720)
+
+# Analysis resolution for frame scoring; small enough that scoring a whole
+# batch of keyframes is a few vectorized NumPy passes.
+SAMPLE_SIZE = (320, 180)
+
+# Text overlay styles rendered for each video: (fill, shadow, band color or None, vertical position)
+VARIANT_STYLES = {
+    "bold": {"fill": (255, 255, 255), "shadow": (0, 0, 0), "band": None, "y": 0.5},
+    "banner": {"fill": (255, 255, 255), "shadow": (0, 0, 0), "band": (0, 0, 0, 170), "y": 0.78},
+    "highlight": {"fill": (255, 221, 0), "shadow": (0, 0, 0), "band": None, "y": 0.22},
+}
+
+
+def sample_keyframes(video_path, max_frames=24, size=SAMPLE_SIZE):
+    """
+    Decodes only the keyframes of a video (the decoder skips every other
+    frame) at analysis resolution.
+    Returns (frames, times): an array of shape (n, h, w, 3) and the
+    timestamp of each frame.
+    """
+    width, height = size
+    cmd = [
+        get_ffmpeg_exe(), "-loglevel", "info", "-nostats",
+        "-skip_frame", "nokey", "-i", video_path,
+        "-an", "-vsync", "vfr",
+        "-vf", f"showinfo,scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    frame_bytes = width * height * 3
+    n = len(result.stdout) // frame_bytes
+    frames = np.frombuffer(result.stdout[:n * frame_bytes], dtype=np.uint8).reshape(n, height, width, 3)
+
+    times = []
+    for line in result.stderr.decode(errors="ignore").splitlines():
+        if "pts_time:" in line:
+            times.append(float(line.split("pts_time:")[1].split()[0]))
+    if len(times) != n:
+        times = [None] * n
+
+    if n > max_frames:
+        picks = np.linspace(0, n - 1, max_frames).astype(int)
+        frames = frames[picks]
+        times = [times[i] for i in picks]
+    return frames, times
+
+
+def extract_frame(video_path, timestamp):
+    """
+    Grabs a single full-resolution frame by seeking (input seeking lands on
+    the nearest keyframe, so nothing before it is decoded).
     """
-    Generates a simple text-based thumbnail using Pillow.
+    cmd = [
+        get_ffmpeg_exe(), "-loglevel", "error",
+        "-ss", f"{timestamp:.3f}", "-i", video_path,
+        "-frames:v", "1", "-f", "image2pipe", "-vcodec", "png", "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return Image.open(BytesIO(result.stdout)).convert("RGB")
+
+
+def score_frames(frames):
+    """
+    Scores a batch of frames at once: Laplacian variance (sharpness) times
+    luma standard deviation (contrast), with near-black and blown-out
+    frames penalised. Returns an array of scores, one per frame.
     """
-    # Create a 1280x720 canvas
-    width, height = 1280, 720
-    image = Image.new('RGB', (width, height), color=bg_color)
+    rgb = frames.astype(np.float32)
+    luma = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+    lap = (-4 * luma[:, 1:-1, 1:-1]
+           + luma[:, :-2, 1:-1] + luma[:, 2:, 1:-1]
+           + luma[:, 1:-1, :-2] + luma[:, 1:-1, 2:])
+    sharpness = lap.reshape(len(frames), -1).var(axis=1)
+    contrast = luma.reshape(len(frames), -1).std(axis=1)
+    brightness = luma.reshape(len(frames), -1).mean(axis=1)
+
+    exposure = 1 - np.clip(np.abs(brightness - 128) / 128, 0, 1) ** 2
+    return np.sqrt(sharpness) * contrast * exposure
+
+
+def pick_best_frame(video_path, max_frames=24):
+    """
+    Returns the highest scoring keyframe of a video as a PIL image at
+    thumbnail resolution.
+    """
+    frames, times = sample_keyframes(video_path, max_frames=max_frames)
+    if not len(frames):
+        raise ValueError(f"No frames could be read from {video_path}")
+    best = int(np.argmax(score_frames(frames)))
+
+    if times[best] is not None:
+        # Fetch the winning keyframe again at full quality
+        try:
+            return fit_image(extract_frame(video_path, times[best]), THUMB_SIZE)
+        except (subprocess.CalledProcessError, OSError):
+            pass
+    return Image.fromarray(frames[best]).resize(THUMB_SIZE, Image.LANCZOS)
+
+
+def fit_image(image, size):
+    """
+    Center-crops and scales an image to fill `size`.
+    """
+    src_w, src_h = image.size
+    dst_w, dst_h = size
+    scale = max(dst_w / src_w, dst_h / src_h)
+    crop_w, crop_h = int(dst_w / scale), int(dst_h / scale)
+    left, top = (src_w - crop_w) // 2, (src_h - crop_h) // 2
+    return image.crop((left, top, left + crop_w, top + crop_h)).resize(size, Image.LANCZOS)
+
+
+def draw_text_overlay(image, text, style):
+    """
+    Draws a centered, wrapped headline on a copy of `image`.
+    """
+    image = image.convert("RGBA")
+    width, height = image.size
+    font_size = 110 if len(text) <= 16 else 80
+    font = get_font(font_size)
+    lines = wrap_text(text, font, width * 0.9)
+    line_height = int(font_size * 1.15)
+    block_h = line_height * len(lines)
+    top = int(height * style["y"] - block_h / 2)
+    top = max(20, min(top, height - block_h - 20))
+
+    if style["band"]:
+        band = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        ImageDraw.Draw(band).rectangle((0, top - 20, width, top + block_h + 20), fill=style["band"])
+        image = Image.alpha_composite(image, band)
+
     draw = ImageDraw.Draw(image)
-    
-    # Try to load a font, fallback to default
-    try:
-        # On Mac, Arial is usually in this path
-        font = ImageFont.truetype("/System/Library/Fonts/Supplemental/Arial Bold.ttf", 80)
-    except:
-        font = ImageFont.load_default()
-    
-    # Calculate text position (centered)
-    # text_width, text_height = draw.textsize(text, font=font) # Older PIL
-    # Newer PIL:
-    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
-    text_width = right - left
-    text_height = bottom - top
-    
-    position = ((width - text_width) / 2, (height - text_height) / 2)
-    
-    # Draw text with a shadow for readability
-    shadow_pos = (position[0] + 5, position[1] + 5)
-    draw.text(shadow_pos, text, font=font, fill=(50, 50, 50))
-    draw.text(position, text, font=font, fill=(255, 255, 255))
-    
-    image.save(output_path)
+    for i, line in enumerate(lines):
+        x = (width - font.getlength(line)) / 2
+        y = top + i * line_height
+        # Draw text with a shadow for readability
+        draw.text((x + 5, y + 5), line, font=font, fill=style["shadow"])
+        draw.text((x, y), line, font=font, fill=style["fill"],
+                  stroke_width=max(2, font_size // 30), stroke_fill=style["shadow"])
+    return image.convert("RGB")
+
+
+def generate_thumbnail(text, output_path, bg_color=(0, 0, 0), video_path=None):
+    """
+    Generates a thumbnail using Pillow. With `video_path`, the best keyframe
+    of the video is used as the background instead of a flat color.
+    """
+    if video_path:
+        image = ImageEnhance.Contrast(pick_best_frame(video_path)).enhance(1.15)
+    else:
+        image = Image.new('RGB', THUMB_SIZE, color=bg_color)
+    draw_text_overlay(image, text, VARIANT_STYLES["bold"]).save(output_path)
     return output_path
 
+
+def generate_thumbnail_variants(video_path, text, output_dir, styles=None):
+    """
+    Renders one thumbnail per style from the video's best frame.
+    Returns {style name: path}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    background = ImageEnhance.Contrast(pick_best_frame(video_path)).enhance(1.15)
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    paths = {}
+    for name in styles or VARIANT_STYLES:
+        path = os.path.join(output_dir, f"{stem}_{name}.png")
+        draw_text_overlay(background, text, VARIANT_STYLES[name]).save(path)
+        paths[name] = path
+    return paths
+
+
+def generate_thumbnail_batch(jobs, output_dir="outputs/thumbnails", styles=None, workers=None):
+    """
+    Renders thumbnail variants for many videos. `jobs` is a list of
+    (video_path, text) pairs. Frame extraction runs in ffmpeg subprocesses
+    and NumPy/Pillow release the GIL, so a thread pool keeps all cores busy.
+    Returns {video_path: {style name: path}}.
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {video: pool.submit(generate_thumbnail_variants, video, text, output_dir, styles)
+                   for video, text in jobs}
+        results = {}
+        for video, future in futures.items():
+            try:
+                results[video] = future.result()
+            except Exception as e:
+                print(f"Warning: Could not generate thumbnails for {video}: {e}")
+        return results
+
 if __name__ == "__main__":
     # Test
     generate_thumbnail("MAKE $500/DAY", "outputs/thumbnails/test.png")
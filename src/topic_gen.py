@@ -1,12 +1,15 @@
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
+from src.topic_history import get_topic_history
 
 load_dotenv()
 
-def generate_finance_topics(niche, num_topics=50, api_key=None):
+def generate_finance_topics(niche, num_topics=50, api_key=None, dedupe=True, return_duplicates=False):
     """
     Generates trending finance topics using Gemini AI.
+    With dedupe, candidates that near-duplicate a topic already scripted,
+    queued or uploaded (see src/topic_history.py) are dropped.
     """
     if api_key:
         genai.configure(api_key=api_key)
@@ -17,8 +20,11 @@ def generate_finance_topics(niche, num_topics=50, api_key=None):
 
     model = genai.GenerativeModel('gemini-3-flash-preview')
     
+    # Ask for a few extra so filtered duplicates don't shrink the list
+    requested = num_topics + min(num_topics, 10) if dedupe else num_topics
+
     prompt = f"""
-    Generate {num_topics} short YouTube video ideas for faceless finance content. 
+    Generate {requested} short YouTube video ideas for faceless finance content. 
     Focus on {niche}. 
     Make each title click-worthy, trending, and under 60 characters.
     Return the list as a plain text list, one topic per line.
@@ -29,7 +35,15 @@ def generate_finance_topics(niche, num_topics=50, api_key=None):
     topics = response.text.strip().split('\n')
     # Filter out empty lines or numbered prefixes if any
     topics = [t.strip().lstrip('0123456789. ') for t in topics if t.strip()]
-    
+
+    duplicates = []
+    if dedupe:
+        topics, duplicates = get_topic_history().filter_new(topics)
+        if duplicates:
+            print(f"Skipped {len(duplicates)} topics similar to past videos.")
+
+    if return_duplicates:
+        return topics[:num_topics], duplicates
     return topics[:num_topics]
 
 if __name__ == "__main__":
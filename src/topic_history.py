@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import zlib
+from array import array
+from datetime import datetime
+
+HISTORY_FILE = "outputs/topic_history.jsonl"
+
+# Pipeline stages in order; a topic's status only moves forward.
+STATUS_RANK = {"scripted": 0, "queued": 1, "uploaded": 2}
+
+# MinHash / LSH parameters. 16 bands of 4 rows puts the LSH threshold at
+# roughly 0.5 Jaccard similarity; candidates are then verified against
+# DUPLICATE_THRESHOLD using the full signature.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from",
+    "how", "i", "in", "into", "is", "it", "just", "my", "of", "on", "or", "the",
+    "this", "to", "way", "ways", "what", "when", "why", "will", "with", "you", "your",
+}
+
+# Phrases that mean the same thing in a video title.
+SYNONYMS = [
+    (r"\b30 days?\b", "month"),
+    (r"\b(1|one) months?\b", "month"),
+    (r"\b7 days?\b", "week"),
+    (r"\b(1|one) weeks?\b", "week"),
+    (r"\b12 months\b", "year"),
+    (r"\b365 days\b", "year"),
+    (r"\bmonthly\b", "month"),
+    (r"\bper\b", ""),
+]
+
+
+def _permutations():
+    # Fixed seeds so signatures stay comparable across runs and processes.
+    a_params, b_params = [], []
+    for i in range(NUM_PERM):
+        a_params.append((zlib.crc32(f"a{i}".encode()) << 16 | 1) % _MERSENNE_PRIME)
+        b_params.append(zlib.crc32(f"b{i}".encode()) % _MERSENNE_PRIME)
+    return list(zip(a_params, b_params))
+
+
+_PERMS = _permutations()
+
+
+def normalize_topic(text):
+    """
+    Lowercases a title and folds money amounts, numbers and common
+    phrasings so near-identical titles produce the same tokens.
+    """
+    text = text.lower()
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    text = re.sub(r"\$?(\d+(?:\.\d+)?)\s*k\b", lambda m: str(int(float(m.group(1)) * 1000)), text)
+    text = text.replace("$", "")
+    for pattern, replacement in SYNONYMS:
+        text = re.sub(pattern, replacement, text)
+    tokens = re.findall(r"[a-z0-9]+", text)
+    tokens = [t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t for t in tokens]
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def shingles(text):
+    """
+    Returns the character shingles of the normalized, sorted tokens.
+    """
+    tokens = normalize_topic(text)
+    if not tokens:
+        return set()
+    joined = " ".join(sorted(tokens))
+    if len(joined) <= SHINGLE_SIZE:
+        return {joined}
+    return {joined[i:i + SHINGLE_SIZE] for i in range(len(joined) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """
+    Computes the MinHash signature of a title as an array of NUM_PERM ints.
+    """
+    hashes = [zlib.crc32(s.encode()) for s in shingles(text)]
+    signature = array("I", [_MAX_HASH] * NUM_PERM)
+    if not hashes:
+        return signature
+    for i, (a, b) in enumerate(_PERMS):
+        signature[i] = min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+    return signature
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimates the Jaccard similarity of two signatures.
+    """
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class TopicHistory:
+    """
+    Persistent index of every topic that has been scripted, queued or uploaded.
+    Records are appended to a JSON Lines file; the LSH buckets are rebuilt in
+    memory on load so lookups only touch a handful of candidates.
+    """
+    def __init__(self, path=HISTORY_FILE, threshold=DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.entries = {}
+        self.buckets = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                signature = array("I")
+                signature.frombytes(bytes.fromhex(record["signature"]))
+                self._index(record, signature)
+
+    def _band_keys(self, signature):
+        for band in range(BANDS):
+            yield (band, tuple(signature[band * ROWS:(band + 1) * ROWS]))
+
+    def _index(self, record, signature):
+        key = record["title"].strip().lower()
+        existing = self.entries.get(key)
+        if existing:
+            # Keep the first sighting but track the furthest pipeline stage.
+            stored = existing["record"]
+            if STATUS_RANK.get(record["status"], 0) >= STATUS_RANK.get(stored["status"], 0):
+                stored["status"] = record["status"]
+            stored["updated_at"] = record.get("recorded_at")
+            return
+        self.entries[key] = {"record": record, "signature": signature}
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, title, status):
+        """
+        Records a topic at a pipeline stage ('scripted', 'queued', 'uploaded').
+        """
+        signature = minhash(title)
+        record = {
+            "title": title,
+            "status": status,
+            "signature": signature.tobytes().hex(),
+            "recorded_at": datetime.now().isoformat()
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._index(record, signature)
+
+    def find_similar(self, title, threshold=None):
+        """
+        Returns past topics similar to `title` as (score, record) pairs,
+        best match first.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        signature = minhash(title)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+
+        matches = []
+        for key in candidates:
+            entry = self.entries[key]
+            score = similarity(signature, entry["signature"])
+            if score >= threshold:
+                matches.append((score, entry["record"]))
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches
+
+    def is_duplicate(self, title):
+        return bool(self.find_similar(title))
+
+    def filter_new(self, titles):
+        """
+        Splits candidate titles into (fresh, duplicates). Titles that repeat
+        each other within the batch are also treated as duplicates.
+        """
+        fresh, duplicates = [], []
+        batch = TopicHistory(path=os.devnull, threshold=self.threshold)
+        for title in titles:
+            match = self.find_similar(title) or batch.find_similar(title)
+            if match:
+                duplicates.append({"title": title, "match": match[0][1]["title"], "score": match[0][0]})
+            else:
+                fresh.append(title)
+                batch._index({"title": title, "status": "candidate"}, minhash(title))
+        return fresh, duplicates
+
+
+_history_cache = {}
+
+
+def get_topic_history(path=HISTORY_FILE):
+    """
+    Returns a process-wide TopicHistory, reloading it if the file changed on disk.
+    """
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cached = _history_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, TopicHistory(path))
+        _history_cache[path] = cached
+    return cached[1]
+
+
+def record_topic(title, status, path=HISTORY_FILE):
+    """
+    Adds a topic to the history index.
+    """
+    if not title:
+        return
+    history = get_topic_history(path)
+    history.add(title, status)
+    if os.path.exists(path):
+        _history_cache[path] = (os.path.getmtime(path), history)
+
+
+if __name__ == "__main__":
+    # Test
+    history = TopicHistory(path=os.devnull)
+    history._index({"title": "How to Save $1000 in a Month", "status": "uploaded"}, minhash("How to Save $1000 in a Month"))
+    for candidate in ["Save $1,000 in 30 Days", "Best Index Funds for Beginners"]:
+        print(candidate, "->", history.find_similar(candidate))
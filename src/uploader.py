@@ -1,4 +1,7 @@
 import os
+import json
+import google.auth.exceptions
+import google.auth.transport.requests
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
@@ -8,24 +11,103 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# The SCOPES for the YouTube Data API
-SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+# The SCOPES for the YouTube Data API, plus read access to YouTube Analytics
+SCOPES = ["https://www.googleapis.com/auth/youtube.upload",
+          "https://www.googleapis.com/auth/yt-analytics.readonly"]
 
-def get_authenticated_service():
+# Optional channel registry, e.g.
+# {"main": {"client_secrets": "client_secrets.json", "daily_quota": 10000},
+#  "shorts": {"client_secrets": "client_secrets_shorts.json"}}
+CHANNELS_FILE = "channels.json"
+CREDENTIALS_DIR = "outputs/credentials"
+DEFAULT_CHANNEL = "default"
+
+def load_channels():
+    """
+    Returns the configured channels. Without channels.json there is a single
+    'default' channel using client_secrets.json.
+    """
+    channels = {}
+    if os.path.exists(CHANNELS_FILE):
+        with open(CHANNELS_FILE, "r") as f:
+            channels = json.load(f)
+    if not channels:
+        channels = {DEFAULT_CHANNEL: {}}
+    for config in channels.values():
+        config.setdefault("client_secrets", "client_secrets.json")
+        # Quota is per Cloud project, i.e. per set of client secrets
+        config.setdefault("quota_pool", os.path.basename(config["client_secrets"]))
+    return channels
+
+def get_channel(channel=None):
+    channels = load_channels()
+    name = channel or next(iter(channels))
+    if name not in channels:
+        raise ValueError(f"Unknown channel: {name}")
+    return name, channels[name]
+
+def token_has_scopes(token_file):
+    """
+    True if a cached token was granted every scope in SCOPES. Tokens from
+    before a scope was added must go through the browser flow again.
+    """
+    with open(token_file, "r") as f:
+        granted = json.load(f).get("scopes") or []
+    return set(SCOPES) <= set(granted)
+
+def get_credentials(channel=None):
     """
     Handles OAuth2 flow for YouTube.
-    Requires 'client_secrets.json' in the root directory.
+    Requires 'client_secrets.json' in the root directory (or the channel's
+    client_secrets from channels.json). Tokens are cached per channel so the
+    browser flow only runs once.
+    """
+    name, config = get_channel(channel)
+    client_secrets_file = config["client_secrets"]
+    token_file = os.path.join(CREDENTIALS_DIR, f"{name}.json")
+
+    credentials = None
+    if os.path.exists(token_file) and token_has_scopes(token_file):
+        credentials = google.oauth2.credentials.Credentials.from_authorized_user_file(token_file, SCOPES)
+        if credentials.expired and credentials.refresh_token:
+            try:
+                credentials.refresh(google.auth.transport.requests.Request())
+            except google.auth.exceptions.RefreshError:
+                credentials = None
+
+    if not credentials or not credentials.valid:
+        if not os.path.exists(client_secrets_file):
+            raise FileNotFoundError(f"{client_secrets_file} not found. Please download it from Google Cloud Console.")
+
+        flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
+            client_secrets_file, SCOPES)
+        credentials = flow.run_local_server(port=0)
+
+    os.makedirs(CREDENTIALS_DIR, exist_ok=True)
+    with open(token_file, "w") as f:
+        f.write(credentials.to_json())
+    return credentials
+
+def get_authenticated_service(channel=None):
+    return googleapiclient.discovery.build("youtube", "v3", credentials=get_credentials(channel))
+
+def get_analytics_service(channel=None):
+    """
+    YouTube Analytics API client for a channel, sharing its cached token.
+    """
+    return googleapiclient.discovery.build("youtubeAnalytics", "v2", credentials=get_credentials(channel))
+
+def is_quota_error(error):
+    """
+    True if an API error means the daily quota is used up.
     """
-    client_secrets_file = "client_secrets.json"
-    
-    if not os.path.exists(client_secrets_file):
-        raise FileNotFoundError("client_secrets.json not found. Please download it from Google Cloud Console.")
-
-    flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
-        client_secrets_file, SCOPES)
-    credentials = flow.run_local_server(port=0)
-    
-    return googleapiclient.discovery.build("youtube", "v3", credentials=credentials)
+    if not isinstance(error, googleapiclient.errors.HttpError) or error.resp.status != 403:
+        return False
+    try:
+        reasons = [e.get("reason") for e in json.loads(error.content).get("error", {}).get("errors", [])]
+    except (ValueError, AttributeError):
+        return "quota" in str(error).lower()
+    return any(r in ("quotaExceeded", "dailyLimitExceeded") for r in reasons)
 
 def upload_video(youtube, file_path, title, description, category_id="27", tags=None, privacy_status="private"):
     """
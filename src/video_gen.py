@@ -1,11 +1,28 @@
 import os
+import re
+import shutil
+import hashlib
+import tempfile
+import time
 import requests
-from moviepy import VideoFileClip, AudioFileClip, TextClip, CompositeVideoClip, concatenate_videoclips
+from moviepy import VideoFileClip, AudioFileClip, TextClip, ImageClip, CompositeVideoClip, concatenate_videoclips
 from dotenv import load_dotenv
 from src.sora_gen import sora_generate_full
+from src.footage_library import FootageLibrary
+from src.renderer import resolve_profile, render_profiles, profile_output_path
+from src.audio_mix import prepare_audio
+from src.ffmpeg_utils import mux_audio
+from src.render_profiler import RenderProfiler
+from src.segment_render import render_segmented
+from src.reframe import smart_crops, share_frames, is_portrait
 
 load_dotenv()
 
+# Pexels downloads for previewed plans. Plans that are never rendered are
+# pruned once their files are this old.
+PLAN_FOOTAGE_DIR = "outputs/plan_footage"
+PLAN_FOOTAGE_HOURS = 24
+
 def fetch_stock_video(query, api_key=None, limit=1):
     """
     Fetches stock video URLs from Pexels API.
@@ -37,58 +54,178 @@ def download_file(url, output_path):
         return output_path
     return None
 
-def create_video(audio_path, video_save_path, keywords=None, script_text=None, source="stock", sora_api_key=None):
+def plan_stock_footage(duration, keywords=None, use_library=True, library=None, download_dir="outputs/videos",
+                       mark_used=True):
     """
-    Combines audio with video footage (Stock or Sora AI) and adds subtitles.
+    Plans stock footage covering `duration` seconds, cycling through keywords.
+    Each keyword is resolved against the local footage library first; Pexels
+    is only queried when the library has no unused match.
+    Returns a list of segments: {"path", "start", "duration", "source"}.
+    Library segments also carry the clip "id", Pexels segments their "url";
+    Pexels files are downloaded into `download_dir`.
+    Library clips are marked used unless `mark_used` is off (see mark_plan_used).
     """
-    audio = AudioFileClip(audio_path)
-    duration = audio.duration
-    
-    clips = []
-    
-    if source == "sora":
-        # Generative Video path
-        try:
-            temp_sora = "outputs/videos/temp_sora.mp4"
-            # Use the script or keywords to prompt Sora
-            sora_prompt = script_text[:500] if script_text else " ".join(keywords)
-            sora_generate_full(sora_prompt, temp_sora, api_key=sora_api_key)
-            clips = [VideoFileClip(temp_sora).resize(height=1080)]
-        except Exception as e:
-            print(f"Sora generation failed: {e}. Falling back to stock footage.")
-            source = "stock"
+    search_queries = keywords if keywords else ["finance", "money", "growth", "savings"]
+    if use_library and library is None:
+        library = FootageLibrary()
+    if library is not None and not len(library):
+        library = None
+
+    segments = []
+    used_ids = set()
+    current_duration = 0
+    q_idx = 0
+
+    while current_duration < duration:
+        query = search_queries[q_idx % len(search_queries)]
+        remaining = duration - current_duration
+        q_idx += 1
 
-    if source == "stock":
-        # Stock Footage path (Pexels)
-        search_queries = keywords if keywords else ["finance", "money", "growth", "savings"]
-        current_duration = 0
-        q_idx = 0
-        
-        while current_duration < duration:
-            query = search_queries[q_idx % len(search_queries)]
+        entry = library.pick(query, exclude=used_ids) if library else None
+        if entry:
+            used_ids.add(entry["id"])
+            path, clip_duration, origin = entry["path"], entry["duration"], "library"
+        else:
             video_url = fetch_stock_video(query)
-            
+
             if not video_url:
                 video_url = fetch_stock_video("finance")
-            
+
             if not video_url: break
-                
-            temp_stock = f"outputs/videos/temp_stock_{len(clips)}.mp4"
-            download_file(video_url, temp_stock)
-            
-            clip = VideoFileClip(temp_stock)
-            remaining = duration - current_duration
-            use_duration = min(clip.duration, 10, remaining)
-            
-            if use_duration < remaining and use_duration < 3:
-                use_duration = min(clip.duration, remaining)
 
-            clip = clip.subclip(0, use_duration).resize(height=1080)
-            clips.append(clip)
-            current_duration += use_duration
-            q_idx += 1
-            if len(clips) > 20: break
+            path = os.path.join(download_dir, f"temp_stock_{hashlib.sha1(video_url.encode()).hexdigest()[:12]}.mp4")
+            if not os.path.exists(path):
+                download_file(video_url, path)
+            clip = VideoFileClip(path)
+            clip_duration = clip.duration
+            clip.close()
+            origin = "pexels"
+
+        use_duration = min(clip_duration, 10, remaining)
+
+        if use_duration < remaining and use_duration < 3:
+            use_duration = min(clip_duration, remaining)
+
+        segment = {"path": path, "start": 0, "duration": use_duration, "source": origin}
+        if origin == "pexels":
+            segment["url"] = video_url
+        else:
+            segment["id"] = entry["id"]
+        segments.append(segment)
+        current_duration += use_duration
+        if len(segments) > 20: break
+
+    if library and used_ids and mark_used:
+        library.mark_used(used_ids)
+    return segments
+
+def mark_plan_used(segments):
+    """
+    Marks a footage plan's library clips as used, when a plan made with
+    mark_used off is rendered.
+    """
+    clip_ids = {seg["id"] for seg in segments if seg["source"] == "library" and seg.get("id")}
+    if clip_ids:
+        FootageLibrary().mark_used(clip_ids)
+
+def discard_plan(segments):
+    """
+    Deletes a footage plan's Pexels downloads, for a plan that won't be
+    rendered (rendering deletes them itself).
+    """
+    for seg in segments:
+        if seg["source"] == "pexels" and os.path.exists(seg["path"]):
+            os.remove(seg["path"])
+
+def prune_plan_footage(keep=(), download_dir=PLAN_FOOTAGE_DIR, max_age_hours=PLAN_FOOTAGE_HOURS):
+    """
+    Deletes plan downloads older than `max_age_hours` that aren't in `keep`,
+    e.g. from plans previewed in a session that ended without rendering.
+    """
+    if not os.path.isdir(download_dir):
+        return
+    keep = {os.path.abspath(path) for path in keep}
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(download_dir):
+        path = os.path.join(download_dir, name)
+        if os.path.abspath(path) not in keep and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+def load_footage(segments, profiler=None, sources=None):
+    """
+    Opens planned footage segments as clips scaled to 1080p height.
+    Pass a list as `sources` to also collect each segment's clip at source
+    resolution, sharing its decode with the scaled clip (for src.reframe's
+    smart crops).
+    """
+    clips = []
+    for i, seg in enumerate(segments):
+        source = VideoFileClip(seg["path"])
+        if profiler:
+            profiler.instrument(source, "decode", f"clip {i}")
+        clip = source.subclip(seg["start"], seg["start"] + seg["duration"])
+        if sources is not None:
+            sources.append(share_frames(clip))
+        clip = clip.resize(height=1080)
+        if profiler:
+            profiler.instrument(clip, "resize", f"clip {i}")
+        clips.append(clip)
+    return clips
+
+def normalize_clip(segment, output_path, height=1080, fps=24):
+    """
+    Trims a planned segment and scales it to `height`, writing a silent MP4
+    that can be reused across renders.
+    """
+    clip = VideoFileClip(segment["path"], audio=False)
+    try:
+        clip = clip.subclip(segment["start"], segment["start"] + segment["duration"]).resize(height=height)
+        clip.write_videofile(output_path, fps=fps, codec="libx264", audio=False, logger=None)
+    finally:
+        clip.close()
+    return output_path
+
+def build_captions(script_text, duration):
+    """
+    Simple subtitle logic: splits the script into sentences and distributes
+    them evenly over `duration`.
+    Returns a list of captions: {"text", "start", "duration"}.
+    """
+    if not script_text:
+        return []
+    sentences = re.split(r'(?<=[.!?]) +', script_text.strip())
+    sentences = [s for s in sentences if s.strip()]
+    if not sentences:
+        return []
+
+    time_per_sentence = duration / len(sentences)
+    captions = []
+    for i, sentence in enumerate(sentences):
+        # Clean sentence for display
+        txt = sentence.strip()
+        if len(txt) > 60: txt = txt[:57] + "..." # Truncate long sentences
+        captions.append({"text": txt, "start": i * time_per_sentence, "duration": time_per_sentence})
+    return captions
 
+def make_caption_clip(text, width):
+    return TextClip(text=text, font_size=50, color='white', font='Arial',
+                    stroke_color='black', stroke_width=2,
+                    method='caption', size=(width * 0.8, None))
+
+def render_caption_image(text, width, output_path):
+    """
+    Renders a caption to a transparent PNG so it can be cached and reused.
+    """
+    make_caption_clip(text, width).save_frame(output_path, 0, True)
+    return output_path
+
+def compose_video(clips, captions, duration, profiler=None, size=None):
+    """
+    Concatenates footage clips to exactly `duration` and overlays captions.
+    Captions may carry an "image" path (pre-rendered caption) or just "text".
+    `size` fixes the frame size, e.g. when composing one part of a longer
+    timeline whose widest clip is elsewhere.
+    """
     if not clips:
         # Fallback to a solid color if no footage found
         from moviepy import ColorClip
@@ -102,45 +239,177 @@ def create_video(audio_path, video_save_path, keywords=None, script_text=None, s
         video_base = video_base.loop(duration=duration)
     else:
         video_base = video_base.subclip(0, duration)
+
+    if size and tuple(video_base.size) != tuple(size):
+        # Centered on the full timeline's canvas, as concatenation would
+        video_base = CompositeVideoClip([video_base.with_position("center")], size=size)
     
-    # Add Subtitles if script_text is provided
+    if profiler:
+        profiler.instrument(video_base, "composite")
+
     final_clips = [video_base]
-    if script_text:
-        # Simple subtitle logic: split by sentences and distribute over duration
-        import re
-        sentences = re.split(r'(?<=[.!?]) +', script_text.strip())
-        sentences = [s for s in sentences if s.strip()]
-        
-        if sentences:
-            time_per_sentence = duration / len(sentences)
-            for i, sentence in enumerate(sentences):
-                # Clean sentence for display
-                txt = sentence.strip()
-                if len(txt) > 60: txt = txt[:57] + "..." # Truncate long sentences
-                
-                try:
-                    subtitle = (TextClip(text=txt, font_size=50, color='white', font='Arial', 
-                                         stroke_color='black', stroke_width=2, 
-                                         method='caption', size=(video_base.w * 0.8, None))
-                                .with_start(i * time_per_sentence)
-                                .with_duration(time_per_sentence)
-                                .with_position(('center', video_base.h * 0.8)))
-                    final_clips.append(subtitle)
-                except Exception as e:
-                    print(f"Warning: Could not create subtitle clip: {e}")
-
-    final_video = CompositeVideoClip(final_clips).set_audio(audio)
+    for i, caption in enumerate(captions):
+        try:
+            if caption.get("image"):
+                subtitle = ImageClip(caption["image"])
+            else:
+                subtitle = make_caption_clip(caption["text"], video_base.w)
+            subtitle = (subtitle.with_start(caption["start"])
+                        .with_duration(caption["duration"])
+                        .with_position(('center', video_base.h * 0.8)))
+            if profiler:
+                profiler.instrument(subtitle, "captions", f"subtitle {i}", blit=True)
+            final_clips.append(subtitle)
+        except Exception as e:
+            print(f"Warning: Could not create subtitle clip: {e}")
+
+    composite = CompositeVideoClip(final_clips)
+    if profiler:
+        profiler.instrument(composite, "composite")
+    return composite
+
+def plan_video(audio_path, keywords=None, script_text=None, use_library=True, download_dir=PLAN_FOOTAGE_DIR):
+    """
+    Plans a stock-footage render without rendering it, e.g. to preview it
+    with src.proxy_cache. Returns (segments, captions, duration); pass the
+    segments back to create_video to render exactly that plan, or to
+    discard_plan to drop it. Library clips are only marked used when the
+    plan is rendered.
+    """
+    audio = AudioFileClip(audio_path)
+    duration = audio.duration
+    audio.close()
+    os.makedirs(download_dir, exist_ok=True)
+    segments = plan_stock_footage(duration, keywords, use_library=use_library, download_dir=download_dir,
+                                  mark_used=False)
+    prune_plan_footage([seg["path"] for seg in segments], download_dir)
+    return segments, build_captions(script_text, duration), duration
+
+def create_video(audio_path, video_save_path, keywords=None, script_text=None, source="stock", sora_api_key=None, use_library=True,
+                 profiles=None, scratch_dir="outputs/videos", threads=None, music_path=None, normalize_audio=True,
+                 profiler=None, segment_workers=None, segments=None, smart_crop=True):
+    """
+    Combines audio with video footage (Stock or Sora AI) and adds subtitles.
+    Stock footage comes from the local footage library where possible,
+    falling back to Pexels for keywords it can't cover.
+
+    With `profiles` (names from src.renderer.OUTPUT_PROFILES or profile dicts),
+    every output is rendered from one decode/composite pass and a dict of
+    {profile name: path} is returned. Outputs are written next to
+    `video_save_path` as <name>_<profile>.mp4 unless a profile sets "path".
+
+    Downloads and temporary files go to `scratch_dir`; give each concurrent
+    render its own. `threads` caps the x264 encoder threads.
+
+    The soundtrack is prepared up front (src.audio_mix): loudness-normalized
+    voiceover, with `music_path` mixed underneath and ducked under speech.
+
+    `profiler=True` (or a RenderProfiler, e.g. with cprofile/stacks enabled)
+    times every frame by phase and saves a report under outputs/profiles/.
+
+    `segment_workers` renders stock footage in parallel: the timeline is cut
+    at clip boundaries, segments are rendered in that many processes and
+    joined without re-encoding (src.segment_render). Not combined with
+    profiling, which times a single process.
+
+    `segments` renders a footage plan from plan_video instead of planning
+    a new one.
+
+    With `smart_crop`, portrait profiles (e.g. "short") are reframed
+    around the action in each stock clip (src.reframe) instead of center
+    cropped from the landscape composite. They are cut from the same
+    decoded source frames, cropped before scaling, so the render stays a
+    single pass; each clip is analysed once on a temporary low-res proxy.
+    """
+    os.makedirs(scratch_dir, exist_ok=True)
+    if profiler is True:
+        profiler = RenderProfiler(name=os.path.splitext(os.path.basename(video_save_path))[0])
+    elif not isinstance(profiler, RenderProfiler):
+        profiler = None
+    if normalize_audio or music_path:
+        audio_path = prepare_audio(audio_path, music_path, normalize=normalize_audio)
+    audio = AudioFileClip(audio_path)
+    duration = audio.duration
+    audio.close()
+    
+    clips = []
+    planned = segments
+    segments = []
     
-    # Write output
-    final_video.write_videofile(video_save_path, fps=24, codec="libx264", audio_codec="aac")
+    if source == "sora":
+        # Generative Video path
+        try:
+            temp_sora = os.path.join(scratch_dir, "temp_sora.mp4")
+            # Use the script or keywords to prompt Sora
+            sora_prompt = script_text[:500] if script_text else " ".join(keywords)
+            sora_generate_full(sora_prompt, temp_sora, api_key=sora_api_key)
+            clips = [VideoFileClip(temp_sora).resize(height=1080)]
+        except Exception as e:
+            print(f"Sora generation failed: {e}. Falling back to stock footage.")
+            source = "stock"
+
+    if source == "stock" and planned:
+        segments = planned
+        mark_plan_used(segments)
+    elif source == "stock":
+        segments = plan_stock_footage(duration, keywords, use_library=use_library, download_dir=scratch_dir)
+
+    captions = build_captions(script_text, duration)
+    # Segments must cover the audio; shorter footage is looped, which only
+    # the single-pass render does
+    segmented = bool(segment_workers and segments and not profiler
+                     and sum(seg["duration"] for seg in segments) >= duration)
+    resolved = [resolve_profile(p) for p in profiles] if profiles else []
+    smart_crop = bool(smart_crop and segments and any(is_portrait(p) for p in resolved))
+    sources = [] if smart_crop else None
+    if source == "stock" and not segmented:
+        clips = load_footage(segments, profiler, sources)
+    # Crop analysis proxies are only needed for this render
+    proxy_dir = tempfile.mkdtemp(prefix="proxies_", dir=scratch_dir) if smart_crop and not segmented else None
+
+    if segmented:
+        result = render_segmented(segments, captions, duration, video_save_path, audio_path, profiles=resolved,
+                                  workers=segment_workers, fps=24, threads=threads, scratch_dir=scratch_dir,
+                                  smart_crop=smart_crop)
+    elif profiles:
+        # Captions are burned in per profile, so the composite is footage only
+        try:
+            crops = smart_crops(sources, segments, resolved, proxy_dir) if smart_crop else None
+            result = render_profiles(compose_video(clips, [], duration, profiler), captions,
+                                     [(p, profile_output_path(video_save_path, p)) for p in resolved],
+                                     fps=24, audio_path=audio_path, threads=threads, profiler=profiler, sources=crops)
+        finally:
+            if proxy_dir:
+                shutil.rmtree(proxy_dir, ignore_errors=True)
+    elif profiler:
+        # Same composition, but frames are pulled and encoded here so each
+        # phase can be timed
+        final_video = compose_video(clips, captions, duration, profiler)
+        main = {"name": "main", "width": final_video.w, "height": final_video.h}
+        render_profiles(final_video, [], [(main, video_save_path)], fps=24,
+                        audio_path=audio_path, threads=threads, profiler=profiler)
+        result = video_save_path
+    else:
+        final_video = compose_video(clips, captions, duration)
+
+        # Write the picture only; ffmpeg muxes the prepared soundtrack in
+        # directly instead of MoviePy re-reading it in chunks
+        silent_path = os.path.join(scratch_dir, f"{os.path.splitext(os.path.basename(video_save_path))[0]}.video.mp4")
+        final_video.write_videofile(silent_path, fps=24, codec="libx264", audio=False, threads=threads)
+        mux_audio(silent_path, audio_path, video_save_path)
+        os.remove(silent_path)
+        result = video_save_path
     
     # Cleanup
-    for i in range(len(clips)):
-        temp_path = f"outputs/videos/temp_stock_{i}.mp4"
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    for seg in segments:
+        if seg["source"] == "pexels" and os.path.exists(seg["path"]):
+            os.remove(seg["path"])
+
+    if profiler:
+        print(profiler.report(24))
+        print(f"Profile saved: {profiler.save(24)}")
             
-    return video_save_path
+    return result
 
 if __name__ == "__main__":
     # Test
@@ -1,37 +1,55 @@
 import os
+import re
+import queue
+import threading
 import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def generate_voiceover(text, output_path, voice_id="pNInz6obpgDQGcFmaJgB", api_key=None):
+DEFAULT_VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+TTS_MODEL_ID = "eleven_multilingual_v2"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75
+}
+
+# Longest text sent in one streaming request. Sentences that pile up while
+# a request is in flight are sent together, up to this size.
+MAX_BATCH_CHARS = 600
+
+# How much already-spoken text is sent as context so batches join smoothly.
+CONTEXT_CHARS = 500
+
+def get_api_key(api_key=None):
+    key = api_key or os.getenv("ELEVENLABS_API_KEY")
+    if not key:
+        raise ValueError("ElevenLabs API Key not found.")
+    return key
+
+def generate_voiceover(text, output_path, voice_id=DEFAULT_VOICE_ID, api_key=None):
     """
     Converts text to speech using ElevenLabs API.
     Default voice_id is 'Adam' (Finance-style voice).
     """
-    key = api_key or os.getenv("ELEVENLABS_API_KEY")
-    if not key:
-        raise ValueError("ElevenLabs API Key not found.")
+    key = get_api_key(api_key)
 
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    
+
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
         "xi-api-key": key
     }
-    
+
     data = {
         "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
+        "model_id": TTS_MODEL_ID,
+        "voice_settings": VOICE_SETTINGS
     }
-    
+
     response = requests.post(url, json=data, headers=headers)
-    
+
     if response.status_code == 200:
         with open(output_path, "wb") as f:
             f.write(response.content)
@@ -39,6 +57,179 @@ def generate_voiceover(text, output_path, voice_id="pNInz6obpgDQGcFmaJgB", api_k
     else:
         raise Exception(f"ElevenLabs API Error: {response.status_code} - {response.text}")
 
+def split_sentences(text):
+    """
+    Splits text into complete sentences and the unfinished remainder.
+    A sentence only counts as complete once whitespace follows its
+    punctuation, so "$1.50" arriving as "$1." + "50" is not cut.
+    """
+    parts = re.split(r'(?<=[.!?])\s+', text)
+    return [p.strip() for p in parts[:-1] if p.strip()], parts[-1]
+
+class VoiceoverStream:
+    """
+    Voices text as it is written. Text is fed in arbitrary chunks; each
+    complete sentence is queued for ElevenLabs' streaming endpoint and the
+    audio is appended to `partial_path` (`output_path` + ".part") as it
+    arrives, so it can be played before the text is finished. The partial
+    file replaces `output_path` only once everything is voiced; on failure
+    or close(flush=False) it is deleted and any existing file is kept.
+
+    Requests run on a background thread, one at a time so the audio stays
+    in order; sentences that arrive meanwhile go out together in the next
+    request.
+    """
+    def __init__(self, output_path, voice_id=DEFAULT_VOICE_ID, api_key=None):
+        self.output_path = output_path
+        self.partial_path = output_path + ".part"
+        self.url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+        self.headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": get_api_key(api_key)
+        }
+        self.buffer = ""
+        self.spoken = ""
+        self.bytes_written = 0
+        self.sentences_done = 0
+        self.error = None
+        self._sentences = queue.Queue()
+        self._closed = False
+        self._aborted = False
+        self._done = threading.Event()
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        # Start from an empty file; readers may open it before any audio lands
+        open(self.partial_path, "wb").close()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, text):
+        """
+        Adds text; complete sentences are queued for speech.
+        """
+        if self.error:
+            raise self.error
+        sentences, self.buffer = split_sentences(self.buffer + text)
+        for sentence in sentences:
+            self._sentences.put(sentence)
+
+    def close(self, flush=True):
+        """
+        Marks the end of the text. With `flush`, the unfinished remainder is
+        spoken too; without it, queued sentences are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not flush:
+            self._aborted = True
+            while not self._sentences.empty():
+                self._sentences.get_nowait()
+        elif self.buffer.strip():
+            self._sentences.put(self.buffer.strip())
+        self.buffer = ""
+        self._sentences.put(None)
+
+    def wait(self, timeout=None):
+        """
+        Waits for all queued speech to be written. Returns True when done,
+        False on timeout. Raises the request error if one failed.
+        """
+        done = self._done.wait(timeout)
+        if done and self.error:
+            raise self.error
+        return done
+
+    def _next_batch(self):
+        """
+        Blocks for the next sentence, then takes whatever else is already
+        queued, up to MAX_BATCH_CHARS. Returns (sentences, finished).
+        """
+        first = self._sentences.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        while len(" ".join(batch)) < MAX_BATCH_CHARS:
+            try:
+                sentence = self._sentences.get_nowait()
+            except queue.Empty:
+                break
+            if sentence is None:
+                return batch, True
+            batch.append(sentence)
+        return batch, False
+
+    def _speak(self, session, text, out):
+        data = {
+            "text": text,
+            "model_id": TTS_MODEL_ID,
+            "voice_settings": VOICE_SETTINGS
+        }
+        if self.spoken:
+            data["previous_text"] = self.spoken[-CONTEXT_CHARS:]
+        with session.post(self.url, json=data, headers=self.headers, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"ElevenLabs API Error: {response.status_code} - {response.text}")
+            for chunk in response.iter_content(chunk_size=4096):
+                if chunk:
+                    out.write(chunk)
+                    out.flush()
+                    self.bytes_written += len(chunk)
+        self.spoken = f"{self.spoken} {text}".strip()
+
+    def _run(self):
+        try:
+            with requests.Session() as session, open(self.partial_path, "ab") as out:
+                finished = False
+                while not finished:
+                    batch, finished = self._next_batch()
+                    if batch:
+                        self._speak(session, " ".join(batch), out)
+                        self.sentences_done += len(batch)
+            if self._aborted:
+                os.remove(self.partial_path)
+            else:
+                os.replace(self.partial_path, self.output_path)
+        except Exception as e:
+            self.error = e
+            if os.path.exists(self.partial_path):
+                os.remove(self.partial_path)
+        finally:
+            self._done.set()
+
+def generate_script_and_voiceover(topic, output_path, voice_id=DEFAULT_VOICE_ID, gemini_key=None,
+                                  eleven_key=None, on_progress=None):
+    """
+    Writes the script for `topic` and voices it at the same time: Gemini's
+    output is streamed and each finished sentence goes straight to
+    ElevenLabs, so total time approaches the slower of the two instead of
+    their sum.
+    `on_progress(script_so_far, stream)` is called from this thread as text
+    and audio arrive. Returns the script.
+    """
+    # Imported here so voiceover-only use doesn't load the Gemini client
+    from src.script_writer import stream_script
+
+    stream = VoiceoverStream(output_path, voice_id, eleven_key)
+    script = ""
+    try:
+        for chunk in stream_script(topic, api_key=gemini_key):
+            script += chunk
+            stream.feed(chunk)
+            if on_progress:
+                on_progress(script, stream)
+    except Exception:
+        stream.close(flush=False)
+        raise
+    stream.close()
+    while not stream.wait(0.25):
+        if on_progress:
+            on_progress(script, stream)
+    if on_progress:
+        on_progress(script, stream)
+    return script.strip()
+
 if __name__ == "__main__":
     # Test
     try: